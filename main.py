@@ -1,4 +1,7 @@
+import argparse
+from datetime import timedelta
 import logging
+import os
 import sys
 
 from dotenv import load_dotenv
@@ -12,6 +15,14 @@ from src.kalauz.OSM_data_processors.mapper import Mapper
 def main(
     demonstration=True,
     show_lines_with_no_data=True,
+    workers=1,
+    offline=False,
+    overpass_cache_time_to_live=timedelta(hours=12),
+    osm_extract=None,
+    overpass_url=None,
+    query_threads=1,
+    map_format="geojson",
+    simplification_zoom=7,
 ) -> None:
     configure_logging(demonstration)
     logging.getLogger(__name__).info("Program started...")
@@ -28,7 +39,17 @@ def main(
         # MavUpdater(category_predictor).run()
         # GysevUpdater(category_predictor).run()
 
-    Mapper(show_lines_with_no_data).run()
+    Mapper(
+        show_lines_with_no_data,
+        workers,
+        offline,
+        overpass_cache_time_to_live,
+        osm_extract,
+        overpass_url,
+        query_threads,
+        map_format,
+        simplification_zoom,
+    ).run()
 
     logging.getLogger(__name__).info("...program finished!")
 
@@ -56,5 +77,83 @@ def configure_logging(demonstration: bool) -> None:
         )
 
 
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="?",
+        const=os.cpu_count(),
+        default=1,
+        metavar="N",
+        help="resolve the geometries of SRs in N processes, one line at a time "
+        "(all cores if N is omitted)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="only use cached Overpass responses, never query the Overpass API",
+    )
+    parser.add_argument(
+        "--overpass-cache-ttl",
+        type=float,
+        default=12,
+        metavar="HOURS",
+        help="re-query the Overpass API if its cached response is older than this",
+    )
+    parser.add_argument(
+        "--osm-extract",
+        metavar="PATH",
+        help="read OSM data from this .osm or .osm.pbf file instead of the Overpass API",
+    )
+    parser.add_argument(
+        "--overpass-url",
+        metavar="URL",
+        help="interpreter endpoint of the Overpass API to query (overpy's default if omitted)",
+    )
+    parser.add_argument(
+        "--query-threads",
+        type=int,
+        default=1,
+        metavar="N",
+        help="query the Overpass API line by line in N threads instead of in a single query",
+    )
+    parser.add_argument(
+        "--map-format",
+        choices=["geojson", "ndjson", "tiles", "binary"],
+        default="geojson",
+        help="export the map as a page loading a gzip-compressed GeoJSON file, "
+        "as a page loading a newline-delimited GeoJSON file written while the features are created, "
+        "as a page loading vector tiles "
+        "or with the data embedded as typed arrays",
+    )
+    parser.add_argument(
+        "--simplify-for-zoom",
+        type=float,
+        default=7,
+        metavar="ZOOM",
+        help="leave out the details of the ways and SRs that aren't visible at this zoom level "
+        "(vector tiles are simplified per zoom level anyway)",
+    )
+    parser.add_argument(
+        "--full-detail",
+        action="store_true",
+        help="export the ways and SRs without simplifying them",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    arguments = parse_arguments()
+    main(
+        workers=arguments.workers,
+        offline=arguments.offline,
+        overpass_cache_time_to_live=timedelta(hours=arguments.overpass_cache_ttl),
+        osm_extract=arguments.osm_extract,
+        overpass_url=arguments.overpass_url,
+        query_threads=arguments.query_threads,
+        map_format=arguments.map_format,
+        simplification_zoom=(
+            None if arguments.full_detail else arguments.simplify_for_zoom
+        ),
+    )
@@ -0,0 +1,83 @@
+from typing import Any, NamedTuple
+from xml.etree.ElementTree import iterparse
+
+
+class ElementVersion(NamedTuple):
+    version: int
+    # ISO 8601 in UTC like `timestamp_osm_base` of Overpass API responses
+    timestamp: str
+
+
+class OSMChange(NamedTuple):
+    """
+    Contents of an osmChange file with elements in the format of the Overpass API JSON output
+    and the version of every element created, modified or deleted.
+    """
+
+    upserted: list[dict[str, Any]]
+    deleted: list[tuple[str, int]]
+    versions: dict[tuple[str, int], ElementVersion]
+
+
+def read_osm_change(path: str) -> OSMChange:
+    """
+    Reads an osmChange file with only the latest version of the elements that are in it more than once.
+    """
+    # `None` for deleted elements
+    elements: dict[tuple[str, int], dict[str, Any] | None] = {}
+    versions: dict[tuple[str, int], ElementVersion] = {}
+    action = ""
+    for event, xml_element in iterparse(path, events=("start", "end")):
+        if event == "start":
+            if xml_element.tag in ["create", "modify", "delete"]:
+                action = xml_element.tag
+            continue
+        if xml_element.tag not in ["node", "way", "relation"]:
+            continue
+
+        element_id = int(xml_element.attrib["id"])
+        key = (xml_element.tag, element_id)
+        version = ElementVersion(
+            version=int(xml_element.attrib.get("version", 0)),
+            timestamp=xml_element.attrib.get("timestamp", ""),
+        )
+        if key in versions and version.version < versions[key].version:
+            xml_element.clear()
+            continue
+        # a later version replaces the earlier one but keeps its place
+        versions[key] = version
+        if action == "delete":
+            elements[key] = None
+        else:
+            element: dict[str, Any] = {
+                "type": xml_element.tag,
+                "id": element_id,
+                "tags": {
+                    tag.attrib["k"]: tag.attrib["v"] for tag in xml_element.iter("tag")
+                },
+            }
+            match xml_element.tag:
+                case "node":
+                    element["lat"] = float(xml_element.attrib["lat"])
+                    element["lon"] = float(xml_element.attrib["lon"])
+                case "way":
+                    element["nodes"] = [
+                        int(node.attrib["ref"]) for node in xml_element.iter("nd")
+                    ]
+                case "relation":
+                    element["members"] = [
+                        {
+                            "type": member.attrib["type"],
+                            "ref": int(member.attrib["ref"]),
+                            "role": member.attrib.get("role", ""),
+                        }
+                        for member in xml_element.iter("member")
+                    ]
+            elements[key] = element
+        # the file is streamed, so parsed elements are freed
+        xml_element.clear()
+    return OSMChange(
+        upserted=[element for element in elements.values() if element],
+        deleted=[key for key, element in elements.items() if element is None],
+        versions=versions,
+    )
@@ -0,0 +1,102 @@
+import logging
+from typing import Final
+
+import osmium
+
+from src.kalauz.OSM_data_processors.OSM_store import (
+    RAILWAY_KEY_PATTERN,
+    OSMStore,
+    OSMStoreBuilder,
+)
+
+MEMBER_TYPES: Final = {"n": "node", "w": "way", "r": "relation"}
+
+
+def read_osm_extract(path: str, operators: list[str]) -> OSMStore:
+    """
+    Reads a local .osm or .osm.pbf extract with the tag filters of the Overpass queries of `Mapper`:
+    - `route=railway` relations with a `ref` operated by one of `operators` and their ways,
+    - ways and nodes with a `railway`, `disused:*` or `abandoned:*` tag and the nodes of these ways.
+
+    Unlike the Overpass queries, the elements aren't restricted to the country and to the areas of stations:
+    the extract is expected to be cut to the country,
+    and ways and nodes with a railway key are kept wherever they are, so the result is a superset.
+
+    The file is streamed three times (relations, ways, nodes) so that only the elements kept are in memory.
+    """
+    logger = logging.getLogger(__name__)
+    handler = OSMExtractHandler(operators)
+
+    for entity_bits, entities in [
+        (osmium.osm.osm_entity_bits.RELATION, "relations"),
+        (osmium.osm.osm_entity_bits.WAY, "ways"),
+        (osmium.osm.osm_entity_bits.NODE, "nodes"),
+    ]:
+        logger.debug(f"Reading {entities} of {path} started...")
+        reader = osmium.io.Reader(path, entity_bits)
+        # extracts of Geofabrik and osmium have the time of their replication state in the header
+        handler.builder.add_timestamp(
+            reader.header().get("osmosis_replication_timestamp") or None
+        )
+        osmium.apply(reader, handler)
+        reader.close()
+    logger.debug(f"...finished!")
+
+    return handler.builder.build()
+
+
+class OSMExtractHandler:
+    """
+    Adds the elements kept to a builder, relations first so that their ways and the nodes of the ways are known.
+    """
+
+    def __init__(self, operators: list[str]) -> None:
+        self.operators = operators
+        self.builder = OSMStoreBuilder()
+        self.way_ids: set[int] = set()
+        self.node_ids: set[int] = set()
+
+    def relation(self, relation: osmium.osm.Relation) -> None:
+        tags = dict(relation.tags)
+        if not (
+            tags.get("route") == "railway"
+            and "ref" in tags
+            and any(operator in tags.get("operator", "") for operator in self.operators)
+        ):
+            return
+        members = [
+            {"type": MEMBER_TYPES[member.type], "ref": member.ref, "role": member.role}
+            for member in relation.members
+        ]
+        self.builder.add_element(
+            {"type": "relation", "id": relation.id, "tags": tags, "members": members}
+        )
+        self.way_ids.update(
+            member.ref for member in relation.members if member.type == "w"
+        )
+
+    def way(self, way: osmium.osm.Way) -> None:
+        if way.id in self.way_ids or has_railway_key(way.tags):
+            nodes = [node.ref for node in way.nodes]
+            self.builder.add_element(
+                {"type": "way", "id": way.id, "tags": dict(way.tags), "nodes": nodes}
+            )
+            self.node_ids.update(nodes)
+
+    def node(self, node: osmium.osm.Node) -> None:
+        if (
+            node.id in self.node_ids or has_railway_key(node.tags)
+        ) and node.location.valid():
+            self.builder.add_element(
+                {
+                    "type": "node",
+                    "id": node.id,
+                    "tags": dict(node.tags),
+                    "lat": node.location.lat,
+                    "lon": node.location.lon,
+                }
+            )
+
+
+def has_railway_key(tags: osmium.osm.TagList) -> bool:
+    return any(RAILWAY_KEY_PATTERN.match(tag.k) for tag in tags)
@@ -0,0 +1,799 @@
+from array import array
+from collections.abc import Iterator
+import hashlib
+import re
+from typing import Any, BinaryIO, Final, NamedTuple
+
+import ijson  # type: ignore
+import numpy as np
+import shapely
+
+from src.kalauz.OSM_data_processors.OSM_change import ElementVersion, OSMChange
+
+# keys of the ways and nodes queried from Overpass
+RAILWAY_KEY_PATTERN: Final = re.compile(r"^(railway|disused:|abandoned:)")
+
+
+class RelationMember(NamedTuple):
+    type: str
+    ref: int
+    role: str
+
+
+class Relation:
+    def __init__(
+        self, relation_id: int, tags: dict[str, str], members: list[RelationMember]
+    ) -> None:
+        self.id = relation_id
+        self.tags = tags
+        self.members = members
+
+    def __repr__(self) -> str:
+        return f"<Relation id={self.id}>"
+
+
+class Node:
+    """
+    A node of an `OSMStore`.
+
+    It's only a reference to a row of the store, so it's cheap to create and two of them are equal
+    if they refer to the same OSM node.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store: "OSMStore", index: int) -> None:
+        self._store = store
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return int(self._store.node_ids[self._index])
+
+    @property
+    def lon(self) -> float:
+        return float(self._store.node_coordinates[self._index, 0])
+
+    @property
+    def lat(self) -> float:
+        return float(self._store.node_coordinates[self._index, 1])
+
+    @property
+    def tags(self) -> dict[str, str]:
+        return self._store.tag_sets[self._store.node_tag_set_indexes[self._index]]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Node):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return self.id
+
+    def __repr__(self) -> str:
+        return f"<Node id={self.id} lat={self.lat} lon={self.lon}>"
+
+
+class Way:
+    """
+    A way of an `OSMStore`.
+
+    It's only a reference to a row of the store, so it's cheap to create and two of them are equal
+    if they refer to the same OSM way.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store: "OSMStore", index: int) -> None:
+        self._store = store
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return int(self._store.way_ids[self._index])
+
+    @property
+    def tags(self) -> dict[str, str]:
+        return self._store.tag_sets[self._store.way_tag_set_indexes[self._index]]
+
+    @property
+    def node_indexes(self) -> np.ndarray:
+        return self._store.way_node_indexes[
+            self._store.way_node_offsets[self._index] : self._store.way_node_offsets[
+                self._index + 1
+            ]
+        ]
+
+    @property
+    def node_ids(self) -> list[int]:
+        return self._store.node_ids[self.node_indexes].tolist()
+
+    @property
+    def nodes(self) -> list[Node]:
+        return [Node(self._store, int(index)) for index in self.node_indexes]
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """
+        Longitudes and latitudes of the nodes of the way as an (n, 2) array.
+        """
+        return self._store.node_coordinates[self.node_indexes]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Way):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return self.id
+
+    def __repr__(self) -> str:
+        return f"<Way id={self.id} nodes={self._store.node_ids[self.node_indexes].tolist()}>"
+
+
+def get_nodes_of_ways(ways: list[Way]) -> list[Node]:
+    """
+    Returns the nodes of `ways`, each only once, in the order of the store.
+    """
+    if not ways:
+        return []
+    store = ways[0]._store
+    node_indexes = np.unique(np.concatenate([way.node_indexes for way in ways]))
+    return [Node(store, int(index)) for index in node_indexes]
+
+
+class OSMStore:
+    """
+    Nodes, ways and relations of an Overpass API response stored column by column.
+
+    - nodes: `node_ids` and `node_coordinates` (longitude, latitude) as NumPy arrays
+    - ways: `way_ids` and the indexes of their nodes in CSR format:
+      the nodes of way `i` are `way_node_indexes[way_node_offsets[i]:way_node_offsets[i + 1]]`
+    - tags: every distinct set of tags is stored once in `tag_sets`,
+      nodes and ways only store its index
+    - relations: a few hundred `Relation` objects
+
+    `Node` and `Way` objects are created on demand and only refer to a row of the store.
+    Rows are never moved, deleted elements are only marked as such in `node_exists` and `way_exists`.
+
+    `timestamp` is when all of the OSM data was last updated, e.g. the earliest `timestamp_osm_base` of the Overpass API responses.
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        node_coordinates: np.ndarray,
+        node_tag_set_indexes: np.ndarray,
+        way_ids: np.ndarray,
+        way_node_offsets: np.ndarray,
+        way_node_indexes: np.ndarray,
+        way_tag_set_indexes: np.ndarray,
+        tag_sets: list[dict[str, str]],
+        relations: list[Relation],
+        timestamp: str | None = None,
+    ) -> None:
+        self.node_ids = node_ids
+        self.node_coordinates = node_coordinates
+        self.node_tag_set_indexes = node_tag_set_indexes
+        self.way_ids = way_ids
+        self.way_node_offsets = way_node_offsets
+        self.way_node_indexes = way_node_indexes
+        self.way_tag_set_indexes = way_tag_set_indexes
+        self.tag_sets = tag_sets
+        self._relations = {relation.id: relation for relation in relations}
+        self.timestamp = timestamp
+
+        self.node_exists = np.ones(len(self.node_ids), dtype=bool)
+        self.way_exists = np.ones(len(self.way_ids), dtype=bool)
+        self._tag_set_indexes: dict[tuple[tuple[str, str], ...], int] = {}
+        # versions of the elements changed by osmChanges
+        self._element_versions: dict[tuple[str, int], int] = {}
+        self.sort_ids()
+
+    def sort_ids(self) -> None:
+        """
+        Sorts the IDs for `find_node_indexes` and `find_way_indexes`, needed again only when rows are appended.
+        """
+        self._node_order = np.argsort(self.node_ids, kind="stable")
+        self._sorted_node_ids = self.node_ids[self._node_order]
+        self._way_order = np.argsort(self.way_ids, kind="stable")
+        self._sorted_way_ids = self.way_ids[self._way_order]
+
+    def find_node_indexes(self, node_ids: Any) -> np.ndarray:
+        return find_indexes(self._sorted_node_ids, self._node_order, node_ids)
+
+    def find_way_indexes(self, way_ids: Any) -> np.ndarray:
+        return find_indexes(self._sorted_way_ids, self._way_order, way_ids)
+
+    @classmethod
+    def from_json(cls, data: dict) -> "OSMStore":
+        builder = OSMStoreBuilder()
+        for element in data["elements"]:
+            builder.add_element(element)
+        builder.add_timestamp(data.get("osm3s", {}).get("timestamp_osm_base"))
+        return builder.build()
+
+    @classmethod
+    def from_file(cls, file: BinaryIO) -> "OSMStore":
+        """
+        Parses an Overpass API response element by element
+        so that only the store is kept in memory, not the parsed JSON.
+        """
+        builder = OSMStoreBuilder()
+        builder.add_elements_of_file(file)
+        return builder.build()
+
+    @property
+    def nodes(self) -> Iterator[Node]:
+        return (Node(self, int(index)) for index in np.flatnonzero(self.node_exists))
+
+    @property
+    def ways(self) -> Iterator[Way]:
+        return (Way(self, int(index)) for index in np.flatnonzero(self.way_exists))
+
+    @property
+    def relations(self) -> list[Relation]:
+        return list(self._relations.values())
+
+    def get_way_linestrings(self, way_indexes: np.ndarray | None = None) -> np.ndarray:
+        """
+        Returns the linestrings of the ways at `way_indexes`, or of `ways` if it's `None`, built at once from the arrays,
+        `None` for ways with less than two nodes.
+        """
+        if way_indexes is None:
+            way_indexes = np.flatnonzero(self.way_exists)
+        lengths = np.diff(self.way_node_offsets)[way_indexes]
+        are_lines = lengths >= 2
+        linestrings = np.full(len(way_indexes), None, dtype=object)
+        if np.any(are_lines):
+            node_indexes = self.way_node_indexes[
+                get_csr_positions(
+                    self.way_node_offsets[way_indexes[are_lines]], lengths[are_lines]
+                )
+            ]
+            linestrings[are_lines] = shapely.linestrings(
+                self.node_coordinates[node_indexes],
+                indices=np.repeat(
+                    np.arange(np.count_nonzero(are_lines)), lengths[are_lines]
+                ),
+            )
+        return linestrings
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a hash of the existing elements that only changes if one of them changes.
+
+        Nodes are hashed in the order of their IDs, ways and relations in the order of the store
+        as the order of the ways of a line matters.
+        """
+        fingerprint = hashlib.blake2b(digest_size=16)
+        tag_set_keys = [repr(get_tag_set_key(tags)).encode() for tags in self.tag_sets]
+
+        node_indexes = np.flatnonzero(self.node_exists)
+        node_indexes = node_indexes[
+            np.argsort(self.node_ids[node_indexes], kind="stable")
+        ]
+        fingerprint.update(self.node_ids[node_indexes].tobytes())
+        fingerprint.update(self.node_coordinates[node_indexes].tobytes())
+        for tag_set_index in self.node_tag_set_indexes[node_indexes].tolist():
+            fingerprint.update(tag_set_keys[tag_set_index])
+
+        for way in self.ways:
+            fingerprint.update(self.way_ids[way._index].tobytes())
+            fingerprint.update(self.node_ids[way.node_indexes].tobytes())
+            fingerprint.update(tag_set_keys[self.way_tag_set_indexes[way._index]])
+
+        for relation in self.relations:
+            fingerprint.update(
+                repr(
+                    (relation.id, get_tag_set_key(relation.tags), relation.members)
+                ).encode()
+            )
+        return fingerprint.hexdigest()
+
+    def get_relation(self, relation_id: int) -> Relation:
+        return self._relations[relation_id]
+
+    def get_ways(self, way_ids: list[int]) -> list[Way]:
+        """
+        Returns the ways with the given IDs in the given order, skipping the ones not in the store.
+        """
+        return [
+            Way(self, int(index))
+            for index in self.find_way_indexes(way_ids)
+            if index >= 0 and self.way_exists[index]
+        ]
+
+    def get_node_indexes(self, node_ids: list[int]) -> np.ndarray:
+        indexes = self.find_node_indexes(node_ids)
+        are_found = indexes >= 0
+        are_found[are_found] = self.node_exists[indexes[are_found]]
+        return np.where(are_found, indexes, -1)
+
+    def get_tag_set_index(self, tags: dict[str, str]) -> int:
+        if not self._tag_set_indexes:
+            self._tag_set_indexes = {
+                get_tag_set_key(tag_set): index
+                for index, tag_set in enumerate(self.tag_sets)
+            }
+        key = get_tag_set_key(tags)
+        if key not in self._tag_set_indexes:
+            self._tag_set_indexes[key] = len(self.tag_sets)
+            self.tag_sets.append(tags)
+        return self._tag_set_indexes[key]
+
+    def apply_change(self, change: OSMChange) -> tuple[set[int], set[int]]:
+        """
+        Applies an osmChange to the store in place.
+
+        Returns the IDs of the ways whose nodes, coordinates or tags have changed
+        and the IDs of the changed relations.
+        """
+        change = self.get_relevant_change(self.get_newer_change(change))
+        changed_node_indexes = self.apply_node_changes(change)
+        way_indexes_of_node_references = np.repeat(
+            np.arange(len(self.way_ids)), np.diff(self.way_node_offsets)
+        )
+        changed_way_ids = set(
+            self.way_ids[
+                way_indexes_of_node_references[
+                    np.isin(self.way_node_indexes, changed_node_indexes)
+                ]
+            ].tolist()
+        )
+        changed_way_ids |= self.apply_way_changes(change)
+        changed_relation_ids = self.apply_relation_changes(change)
+        return changed_way_ids, changed_relation_ids
+
+    def get_newer_change(self, change: OSMChange) -> OSMChange:
+        """
+        Returns `change` without the elements that are already in the store in the same or a newer version:
+        the ones edited before `timestamp` and the ones whose version isn't newer than the one applied before.
+        """
+
+        def is_newer(key: tuple[str, int]) -> bool:
+            version = change.versions.get(key, ElementVersion(version=0, timestamp=""))
+            # both are ISO 8601 in UTC, so they're in order as strings too
+            if (
+                self.timestamp
+                and version.timestamp
+                and version.timestamp <= self.timestamp
+            ):
+                return False
+            # elements without a version are always applied
+            return not version.version or version.version > self._element_versions.get(
+                key, 0
+            )
+
+        upserted = [
+            element
+            for element in change.upserted
+            if is_newer((element["type"], element["id"]))
+        ]
+        deleted = [key for key in change.deleted if is_newer(key)]
+        for key in [(element["type"], element["id"]) for element in upserted] + deleted:
+            if key in change.versions:
+                self._element_versions[key] = change.versions[key].version
+        return OSMChange(upserted=upserted, deleted=deleted, versions=change.versions)
+
+    def get_relevant_change(self, change: OSMChange) -> OSMChange:
+        """
+        Returns `change` with only the elements that the Overpass queries would return:
+        `route=railway` relations, ways and nodes with a railway key,
+        and the members of the relations and the nodes of the ways kept.
+
+        Elements of the store that aren't relevant anymore (e.g. a way without its `railway` tag) are deleted instead.
+        """
+        deleted = list(change.deleted)
+        changed_keys = set(deleted) | {
+            (element["type"], element["id"]) for element in change.upserted
+        }
+
+        relations = [
+            element for element in change.upserted if element["type"] == "relation"
+        ]
+        kept_relations = [
+            convert_to_relation(relation)
+            for relation in relations
+            if is_railway_route(relation["tags"])
+        ]
+        member_keys = {
+            (member.type, member.ref)
+            for relation in kept_relations
+            + [
+                relation
+                for relation in self._relations.values()
+                if ("relation", relation.id) not in changed_keys
+            ]
+            for member in relation.members
+        }
+
+        ways = [element for element in change.upserted if element["type"] == "way"]
+        are_ways_kept = [
+            is_railway_element(way["tags"]) or ("way", way["id"]) in member_keys
+            for way in ways
+        ]
+
+        # nodes of the ways of the store that aren't changed and of the ways kept
+        are_unchanged_ways = self.way_exists.copy()
+        changed_way_indexes = self.find_way_indexes(
+            [way_id for element_type, way_id in changed_keys if element_type == "way"]
+        )
+        are_unchanged_ways[changed_way_indexes[changed_way_indexes >= 0]] = False
+        referenced_node_ids = np.concatenate(
+            (
+                self.node_ids[
+                    self.way_node_indexes[
+                        np.repeat(are_unchanged_ways, np.diff(self.way_node_offsets))
+                    ]
+                ],
+                np.array(
+                    [
+                        node_id
+                        for way, is_kept in zip(ways, are_ways_kept)
+                        if is_kept
+                        for node_id in way["nodes"]
+                    ]
+                    + [
+                        ref for member_type, ref in member_keys if member_type == "node"
+                    ],
+                    dtype=np.int64,
+                ),
+            )
+        )
+        nodes = [element for element in change.upserted if element["type"] == "node"]
+        are_nodes_referenced = np.isin(
+            np.array([node["id"] for node in nodes], dtype=np.int64),
+            referenced_node_ids,
+        )
+        are_nodes_kept = [
+            is_railway_element(node["tags"]) or bool(is_referenced)
+            for node, is_referenced in zip(nodes, are_nodes_referenced)
+        ]
+
+        upserted: list[dict[str, Any]] = []
+        for elements, are_kept, indexes in (
+            (
+                relations,
+                [is_railway_route(relation["tags"]) for relation in relations],
+                [
+                    0 if relation["id"] in self._relations else -1
+                    for relation in relations
+                ],
+            ),
+            (ways, are_ways_kept, self.find_way_indexes([way["id"] for way in ways])),
+            (
+                nodes,
+                are_nodes_kept,
+                self.find_node_indexes([node["id"] for node in nodes]),
+            ),
+        ):
+            for element, is_kept, index in zip(elements, are_kept, indexes):
+                if is_kept:
+                    upserted.append(element)
+                elif index >= 0:
+                    deleted.append((element["type"], element["id"]))
+        return OSMChange(upserted=upserted, deleted=deleted, versions=change.versions)
+
+    def apply_node_changes(self, change: OSMChange) -> np.ndarray:
+        nodes = [element for element in change.upserted if element["type"] == "node"]
+        indexes = self.find_node_indexes([node["id"] for node in nodes])
+        coordinates = np.array(
+            [(node["lon"], node["lat"]) for node in nodes], dtype=np.float64
+        ).reshape(-1, 2)
+        tag_set_indexes = np.array(
+            [self.get_tag_set_index(node["tags"]) for node in nodes], dtype=np.int32
+        )
+        are_new = indexes < 0
+        # deleted nodes that are created again get their old row back
+        self.node_coordinates[indexes[~are_new]] = coordinates[~are_new]
+        self.node_tag_set_indexes[indexes[~are_new]] = tag_set_indexes[~are_new]
+        self.node_exists[indexes[~are_new]] = True
+
+        deleted_indexes = self.find_node_indexes(
+            [
+                element_id
+                for element_type, element_id in change.deleted
+                if element_type == "node"
+            ],
+        )
+        deleted_indexes = deleted_indexes[deleted_indexes >= 0]
+        self.node_exists[deleted_indexes] = False
+
+        if np.any(are_new):
+            self.node_ids = np.concatenate(
+                (
+                    self.node_ids,
+                    [node["id"] for node, is_new in zip(nodes, are_new) if is_new],
+                )
+            ).astype(np.int64)
+            self.node_coordinates = np.concatenate(
+                (self.node_coordinates, coordinates[are_new])
+            )
+            self.node_tag_set_indexes = np.concatenate(
+                (self.node_tag_set_indexes, tag_set_indexes[are_new])
+            )
+            self.node_exists = np.concatenate(
+                (self.node_exists, np.ones(np.count_nonzero(are_new), dtype=bool))
+            )
+            self.sort_ids()
+        return np.concatenate((indexes[~are_new], deleted_indexes))
+
+    def apply_way_changes(self, change: OSMChange) -> set[int]:
+        ways = [element for element in change.upserted if element["type"] == "way"]
+        indexes = self.find_way_indexes([way["id"] for way in ways])
+        are_new = indexes < 0
+
+        # the nodes of all changed ways are looked up at once,
+        # nodes missing from the store are left out like in `OSMStoreBuilder.build`
+        node_indexes = self.get_node_indexes(
+            [node_id for way in ways for node_id in way["nodes"]]
+        )
+        are_present = node_indexes >= 0
+        lengths = np.bincount(
+            np.repeat(np.arange(len(ways)), [len(way["nodes"]) for way in ways])[
+                are_present
+            ],
+            minlength=len(ways),
+        )
+        changed_rows_start = len(self.way_node_indexes)
+        changed_row_starts = changed_rows_start + np.concatenate(
+            ([0], np.cumsum(lengths)[:-1])
+        ).astype(np.int64)
+        all_node_indexes = np.concatenate(
+            (self.way_node_indexes, node_indexes[are_present])
+        )
+        tag_set_indexes = np.array(
+            [self.get_tag_set_index(way["tags"]) for way in ways], dtype=np.int32
+        )
+
+        # rows of the changed ways point to their new nodes at the end of `all_node_indexes`
+        row_starts = np.concatenate(
+            (self.way_node_offsets[:-1], changed_row_starts[are_new])
+        )
+        row_lengths = np.concatenate((np.diff(self.way_node_offsets), lengths[are_new]))
+        row_starts[indexes[~are_new]] = changed_row_starts[~are_new]
+        row_lengths[indexes[~are_new]] = lengths[~are_new]
+
+        self.way_node_indexes = all_node_indexes[
+            get_csr_positions(row_starts, row_lengths)
+        ].astype(np.int64)
+        self.way_node_offsets = np.concatenate(([0], np.cumsum(row_lengths))).astype(
+            np.int64
+        )
+        self.way_tag_set_indexes[indexes[~are_new]] = tag_set_indexes[~are_new]
+        self.way_exists[indexes[~are_new]] = True
+
+        deleted_ids = [
+            element_id
+            for element_type, element_id in change.deleted
+            if element_type == "way"
+        ]
+        deleted_indexes = self.find_way_indexes(deleted_ids)
+        self.way_exists[deleted_indexes[deleted_indexes >= 0]] = False
+
+        if np.any(are_new):
+            self.way_ids = np.concatenate(
+                (
+                    self.way_ids,
+                    [way["id"] for way, is_new in zip(ways, are_new) if is_new],
+                )
+            ).astype(np.int64)
+            self.way_tag_set_indexes = np.concatenate(
+                (self.way_tag_set_indexes, tag_set_indexes[are_new])
+            )
+            self.way_exists = np.concatenate(
+                (self.way_exists, np.ones(np.count_nonzero(are_new), dtype=bool))
+            )
+            self.sort_ids()
+        return {way["id"] for way in ways} | set(deleted_ids)
+
+    def apply_relation_changes(self, change: OSMChange) -> set[int]:
+        changed_relation_ids: set[int] = set()
+        for element in change.upserted:
+            if element["type"] == "relation":
+                self._relations[element["id"]] = convert_to_relation(element)
+                changed_relation_ids.add(element["id"])
+        for element_type, element_id in change.deleted:
+            if element_type == "relation":
+                self._relations.pop(element_id, None)
+                changed_relation_ids.add(element_id)
+        return changed_relation_ids
+
+    def get_subset(self, relation: Relation, ways: list[Way]) -> "OSMStore":
+        """
+        Returns a store with only the given relation, ways and their nodes
+        so that they can be sent to another process cheaply.
+        """
+        way_indexes = np.array([way._index for way in ways], dtype=np.int64)
+        lengths = (
+            self.way_node_offsets[way_indexes + 1] - self.way_node_offsets[way_indexes]
+        )
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        old_node_indexes = self.way_node_indexes[
+            get_csr_positions(self.way_node_offsets[way_indexes], lengths)
+        ]
+        node_indexes, way_node_indexes = np.unique(
+            old_node_indexes, return_inverse=True
+        )
+        tag_set_indexes, new_tag_set_indexes = np.unique(
+            np.concatenate(
+                (
+                    self.node_tag_set_indexes[node_indexes],
+                    self.way_tag_set_indexes[way_indexes],
+                )
+            ),
+            return_inverse=True,
+        )
+        return OSMStore(
+            node_ids=self.node_ids[node_indexes],
+            node_coordinates=self.node_coordinates[node_indexes],
+            node_tag_set_indexes=new_tag_set_indexes[: len(node_indexes)].astype(
+                np.int32
+            ),
+            way_ids=self.way_ids[way_indexes],
+            way_node_offsets=offsets,
+            way_node_indexes=way_node_indexes,
+            way_tag_set_indexes=new_tag_set_indexes[len(node_indexes) :].astype(
+                np.int32
+            ),
+            tag_sets=[self.tag_sets[index] for index in tag_set_indexes],
+            relations=[relation],
+        )
+
+
+class OSMStoreBuilder:
+    """
+    Collects the elements of an Overpass API response one by one into compact arrays.
+    """
+
+    def __init__(self) -> None:
+        self.node_ids = array("q")
+        self.node_coordinates = array("d")
+        self.node_tag_set_indexes = array("i")
+        self.way_ids = array("q")
+        self.way_lengths = array("q")
+        self.way_node_ids = array("q")
+        self.way_tag_set_indexes = array("i")
+        self.tag_sets: list[dict[str, str]] = [{}]
+        self.tag_set_indexes: dict[tuple[tuple[str, str], ...], int] = {(): 0}
+        self.relations: dict[int, Relation] = {}
+        self.timestamp: str | None = None
+
+    def add_element(self, element: dict[str, Any]) -> None:
+        match element["type"]:
+            case "node":
+                self.node_ids.append(element["id"])
+                self.node_coordinates.extend((element["lon"], element["lat"]))
+                self.node_tag_set_indexes.append(
+                    self.intern_tags(element.get("tags", {}))
+                )
+            case "way":
+                self.way_ids.append(element["id"])
+                self.way_lengths.append(len(element["nodes"]))
+                self.way_node_ids.extend(element["nodes"])
+                self.way_tag_set_indexes.append(
+                    self.intern_tags(element.get("tags", {}))
+                )
+            case "relation":
+                self.relations[element["id"]] = convert_to_relation(element)
+
+    def add_elements_of_file(self, file: BinaryIO) -> None:
+        # the header is before the elements, so only the beginning of the file is read twice
+        self.add_timestamp(next(ijson.items(file, "osm3s.timestamp_osm_base"), None))
+        file.seek(0)
+        for element in ijson.items(file, "elements.item", use_float=True):
+            self.add_element(element)
+
+    def add_timestamp(self, timestamp: str | None) -> None:
+        """
+        Keeps the earliest timestamp of the responses added as cached responses can be of different ages,
+        so that no edit made after the oldest of them is skipped.
+        """
+        if timestamp and (self.timestamp is None or timestamp < self.timestamp):
+            self.timestamp = timestamp
+
+    def intern_tags(self, tags: dict[str, str]) -> int:
+        key = get_tag_set_key(tags)
+        if key not in self.tag_set_indexes:
+            self.tag_set_indexes[key] = len(self.tag_sets)
+            self.tag_sets.append(tags)
+        return self.tag_set_indexes[key]
+
+    def build(self) -> "OSMStore":
+        # Overpass returns elements as many times as they are in the output sets
+        node_ids, first_node_indexes = np.unique(
+            np.frombuffer(self.node_ids, dtype=np.int64), return_index=True
+        )
+        node_indexes = np.sort(first_node_indexes)
+        node_ids = np.frombuffer(self.node_ids, dtype=np.int64)[node_indexes]
+        node_order = np.argsort(node_ids, kind="stable")
+
+        way_ids, first_way_indexes = np.unique(
+            np.frombuffer(self.way_ids, dtype=np.int64), return_index=True
+        )
+        way_indexes = np.sort(first_way_indexes)
+        all_way_lengths = np.frombuffer(self.way_lengths, dtype=np.int64)
+        all_way_offsets = np.concatenate(([0], np.cumsum(all_way_lengths)))
+        way_lengths = all_way_lengths[way_indexes]
+        way_node_ids = np.frombuffer(self.way_node_ids, dtype=np.int64)[
+            get_csr_positions(all_way_offsets[way_indexes], way_lengths)
+        ]
+
+        # nodes missing from the response are left out of their ways
+        way_node_indexes = find_indexes(node_ids[node_order], node_order, way_node_ids)
+        are_present = way_node_indexes >= 0
+        way_lengths = np.bincount(
+            np.repeat(np.arange(len(way_indexes)), way_lengths)[are_present],
+            minlength=len(way_indexes),
+        )
+
+        return OSMStore(
+            node_ids=node_ids,
+            node_coordinates=np.frombuffer(self.node_coordinates, dtype=np.float64)
+            .reshape(-1, 2)[node_indexes]
+            .copy(),
+            node_tag_set_indexes=np.frombuffer(
+                self.node_tag_set_indexes, dtype=np.int32
+            )[node_indexes].astype(np.int32),
+            way_ids=np.frombuffer(self.way_ids, dtype=np.int64)[way_indexes],
+            way_node_offsets=np.concatenate(([0], np.cumsum(way_lengths))),
+            way_node_indexes=way_node_indexes[are_present],
+            way_tag_set_indexes=np.frombuffer(self.way_tag_set_indexes, dtype=np.int32)[
+                way_indexes
+            ].astype(np.int32),
+            tag_sets=self.tag_sets,
+            relations=list(self.relations.values()),
+            timestamp=self.timestamp,
+        )
+
+
+def convert_to_relation(element: dict[str, Any]) -> Relation:
+    return Relation(
+        relation_id=element["id"],
+        tags=element.get("tags", {}),
+        members=[
+            RelationMember(
+                type=member["type"],
+                ref=member["ref"],
+                role=member.get("role", ""),
+            )
+            for member in element["members"]
+        ],
+    )
+
+
+def is_railway_element(tags: dict[str, str]) -> bool:
+    return any(RAILWAY_KEY_PATTERN.match(key) for key in tags)
+
+
+def is_railway_route(tags: dict[str, str]) -> bool:
+    return tags.get("route") == "railway" and "ref" in tags
+
+
+def get_tag_set_key(tags: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted(tags.items()))
+
+
+def find_indexes(
+    sorted_ids: np.ndarray, order: np.ndarray, ids_to_find: Any
+) -> np.ndarray:
+    """
+    Returns the indexes of `ids_to_find` in the unsorted IDs (-1 where not found),
+    where `order` is the permutation that sorts them into `sorted_ids`.
+    """
+    ids_to_find = np.asarray(ids_to_find, dtype=np.int64)
+    if not len(sorted_ids):
+        return np.full(len(ids_to_find), -1, dtype=np.int64)
+    positions = np.minimum(
+        np.searchsorted(sorted_ids, ids_to_find), len(sorted_ids) - 1
+    )
+    return np.where(sorted_ids[positions] == ids_to_find, order[positions], -1)
+
+
+def get_csr_positions(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Returns `concatenate([arange(start, start + length) for start, length in zip(starts, lengths)])`.
+    """
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    return np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
@@ -0,0 +1,64 @@
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import os
+from typing import BinaryIO
+
+
+class OverpassCache:
+    """
+    Raw Overpass API responses stored on disk, keyed by a hash of the query text.
+    """
+
+    def __init__(self, directory: str, time_to_live: timedelta, offline: bool) -> None:
+        self.logger = logging.getLogger(__name__)
+
+        self.directory = directory
+        self.time_to_live = time_to_live
+        self.offline = offline
+
+    def get_path(self, query_text: str) -> str:
+        query_hash = hashlib.sha256(query_text.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{query_hash}.json")
+
+    def contains(self, query_text: str) -> bool:
+        path = self.get_path(query_text)
+        try:
+            age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(path))
+        except FileNotFoundError:
+            if self.offline:
+                self.logger.critical(
+                    f"No cached Overpass response found at {path} in offline mode!"
+                )
+                raise
+            return False
+        if age > self.time_to_live and not self.offline:
+            self.logger.debug(f"Cached Overpass response at {path} is stale!")
+            return False
+        return True
+
+    def read(self, query_text: str) -> BinaryIO | None:
+        """
+        Returns the cached response opened for reading so that it can be parsed without loading it into memory.
+        """
+        if not self.contains(query_text):
+            return None
+
+        path = self.get_path(query_text)
+        self.logger.debug(f"Cached Overpass response read from {path}!")
+        return open(path, "rb")
+
+    def write(self, query_text: str, response: Iterable[bytes]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(query_text)
+        # write to a temporary file first so that an interrupted run doesn't leave a truncated response behind
+        try:
+            with open(f"{path}.part", "wb") as cached_response:
+                for chunk in response:
+                    cached_response.write(chunk)
+        except BaseException:
+            os.remove(f"{path}.part")
+            raise
+        os.replace(f"{path}.part", path)
+        self.logger.debug(f"Overpass response cached at {path}!")
@@ -10,6 +10,27 @@ def get_area_boundary() -> str:
 
 
 def get_route_relations() -> str:
+    return (
+        get_route_relation_filter()
+        + """
+        >>;
+        out;
+        
+    """
+    )
+
+
+def get_route_relation_ids() -> str:
+    return (
+        get_route_relation_filter()
+        + """
+        out ids;
+        
+    """
+    )
+
+
+def get_route_relation_filter() -> str:
     # future: replace lines below when https://github.com/drolbr/Overpass-API/issues/146 is closed
     #     relation["route"="railway"]["ref"]["operator"~"(^MÁV(?=;))|((?<=;)MÁV(?=;))|((?<=;)MÁV$)"](area.country);
     #     relation["route"="railway"]["ref"]["operator"~"(^GYSEV(?=;))|((?<=;)GYSEV(?=;))|((?<=;)GYSEV$)"](area.country);
@@ -17,8 +38,69 @@ def get_route_relations() -> str:
         (
             relation["route"="railway"]["ref"]["operator"~"MÁV"](area.country);
             relation["route"="railway"]["ref"]["operator"~"GYSEV"](area.country);
-        );
+        );"""
+
+
+def get_route_relation(relation_id: int) -> str:
+    return f"""
+        [out:json][timeout:500];
+        
+        relation({relation_id});
         >>;
         out;
         
     """
+
+
+def restrict_to_bounding_box(
+    query_text: str, bounding_box: tuple[float, float, float, float]
+) -> str:
+    """
+    Returns `query_text` with only the elements in `bounding_box`.
+    The global `[bbox:…]` setting doesn't restrict recursions, so the members of relations and the nodes of ways
+    are queried with the bounding box too instead of `>>;` and `(._;>;);`.
+    """
+    south, west, north, east = bounding_box
+    bounding_box_filter = f"({south},{west},{north},{east})"
+    return (
+        query_text.replace(
+            "[out:json]", f"[out:json][bbox:{south},{west},{north},{east}]", 1
+        )
+        .replace("(._;>;);", get_recursion_down(bounding_box_filter))
+        .replace(
+            ">>;",
+            f"""
+        (
+            ._;
+            relation(r){bounding_box_filter};
+        );"""
+            + get_recursion_down(bounding_box_filter),
+        )
+    )
+
+
+def get_recursion_down(bounding_box_filter: str) -> str:
+    return f"""
+        (
+            ._;
+            way(r){bounding_box_filter};
+            node(r){bounding_box_filter};
+        );
+        (
+            ._;
+            node(w){bounding_box_filter};
+        );"""
+
+
+def split_bounding_box(
+    bounding_box: tuple[float, float, float, float],
+) -> list[tuple[float, float, float, float]]:
+    south, west, north, east = bounding_box
+    middle_latitude = (south + north) / 2
+    middle_longitude = (west + east) / 2
+    return [
+        (south, west, middle_latitude, middle_longitude),
+        (south, middle_longitude, middle_latitude, east),
+        (middle_latitude, west, north, middle_longitude),
+        (middle_latitude, middle_longitude, north, east),
+    ]
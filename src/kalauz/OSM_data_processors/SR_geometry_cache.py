@@ -0,0 +1,266 @@
+import logging
+import math
+from typing import Any, ClassVar, Final
+
+import shapely
+from sqlalchemy import (
+    Column,
+    Engine,
+    ForeignKey,
+    Index,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+)
+from sqlalchemy.types import UserDefinedType
+
+from src.kalauz.SR import SR
+
+SR_GEOMETRY_ATTRIBUTES: Final = (
+    "metre_post_from_coordinates",
+    "metre_post_to_coordinates",
+    "geometry",
+)
+WGS_84: Final = 4326
+# MySQL orders the coordinates of WGS 84 as latitude, longitude by default
+AXIS_ORDER: Final = "axis-order=long-lat"
+# a bit less than the shortest degree of latitude so that no SR near a point is left out
+METRES_PER_DEGREE_OF_LATITUDE: Final = 110_000
+# created by `SRUpdater`, not imported so that mapping doesn't depend on the SR table processors
+SR_TABLE_NAME: Final = "speed_restrictions"
+
+
+class Geometry(UserDefinedType):
+    """
+    A MySQL spatial column of WGS 84 longitudes and latitudes, written and read as WKB.
+    """
+
+    cache_ok = True
+
+    def __init__(self, geometry_type: str) -> None:
+        self.geometry_type = geometry_type
+
+    def get_col_spec(self, **kw: Any) -> str:
+        return f"{self.geometry_type} SRID {WGS_84}"
+
+    def bind_expression(self, bindvalue: Any) -> Any:
+        return func.ST_GeomFromWKB(bindvalue, WGS_84, AXIS_ORDER)
+
+    def column_expression(self, column: Any) -> Any:
+        return func.ST_AsBinary(column, AXIS_ORDER)
+
+
+class SRGeometryCache:
+    """
+    The coordinates of the metre posts and the geometries of SRs stored in the database
+    with the fingerprint of the OSM data of their line (see `OSMStore.get_fingerprint`)
+    so that they're only computed again for new SRs and SRs whose line has changed.
+
+    The geometries are spatially indexed, so the SRs in an area or near a station can be queried on the server
+    without the OSM data or resolving them again.
+    They're in a table of their own as MySQL only indexes spatial columns that can't be `NULL`,
+    but SRs are added before their geometries are known.
+    The table is created when the cache is first used.
+    Columns with an SRID and the axis order of WKB need MySQL 8.0, on older servers nothing is cached.
+    """
+
+    TABLE_NAME: ClassVar[str] = "speed_restriction_geometries"
+    database_metadata: ClassVar[MetaData] = MetaData()
+    # only the column referenced, so that the foreign key can be resolved
+    sr_table: ClassVar[Table] = Table(
+        SR_TABLE_NAME,
+        database_metadata,
+        Column(name="id", type_=String(255), primary_key=True),
+    )
+    table: ClassVar[Table] = Table(
+        TABLE_NAME,
+        database_metadata,
+        Column(
+            "id",
+            String(255),
+            ForeignKey(f"{SR_TABLE_NAME}.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+            primary_key=True,
+        ),
+        Column(name="line_fingerprint", type_=String(32), nullable=False),
+        Column(
+            name="metre_post_from_coordinates", type_=Geometry("POINT"), nullable=False
+        ),
+        Column(
+            name="metre_post_to_coordinates", type_=Geometry("POINT"), nullable=False
+        ),
+        Column(name="geometry", type_=Geometry("GEOMETRY"), nullable=False),
+        Index(f"{TABLE_NAME}_geometry", "geometry", mysql_prefix="SPATIAL"),
+    )
+
+    def __init__(self, engine: Engine) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.engine = engine
+        self._is_available: bool | None = None
+
+    def is_available(self) -> bool:
+        """
+        Creates the table when the cache is first used or returns `False` if the server doesn't support it.
+        """
+        if self._is_available is None:
+            # the version of the server is known after the first connection
+            with self.engine.connect():
+                pass
+            dialect = self.engine.dialect
+            if dialect.name == "mysql" and (
+                dialect.is_mariadb or (dialect.server_version_info or ()) < (8, 0)
+            ):
+                self.logger.warning(
+                    f"SR geometries aren't cached as the database server isn't MySQL 8.0 or later!"
+                )
+                self._is_available = False
+            else:
+                self.table.create(bind=self.engine, checkfirst=True)
+                self._is_available = True
+        return self._is_available
+
+    def restore(self, srs: list[SR], line_fingerprints: list[str]) -> list[bool]:
+        """
+        Sets the cached coordinates and geometries of the SRs whose line hasn't changed since they were stored.
+
+        Returns whether each SR was restored.
+        """
+        if not self.is_available():
+            return [False] * len(srs)
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(self.table).where(
+                    self.table.c.id.in_([sr.id for sr in srs if sr.id])
+                )
+            ).all()
+        rows_of_ids = {row.id: row for row in rows}
+
+        are_restored: list[bool] = []
+        for sr, line_fingerprint in zip(srs, line_fingerprints):
+            row = rows_of_ids.get(sr.id)
+            if row is None or row.line_fingerprint != line_fingerprint:
+                are_restored.append(False)
+                continue
+            geometries = shapely.from_wkb(
+                [getattr(row, attribute) for attribute in SR_GEOMETRY_ATTRIBUTES]
+            )
+            for attribute, geometry in zip(SR_GEOMETRY_ATTRIBUTES, geometries):
+                setattr(sr, attribute, geometry)
+            are_restored.append(True)
+        self.logger.debug(
+            f"{sum(are_restored)} of {len(srs)} SR geometries restored from the cache!"
+        )
+        return are_restored
+
+    def store(self, srs: list[SR], line_fingerprints: list[str]) -> None:
+        """
+        Stores the coordinates and geometries of the SRs that have all of them, replacing the ones stored before.
+        """
+        rows = [
+            {"id": sr.id, "line_fingerprint": line_fingerprint}
+            | {
+                attribute: shapely.to_wkb(getattr(sr, attribute))
+                for attribute in SR_GEOMETRY_ATTRIBUTES
+            }
+            for sr, line_fingerprint in zip(srs, line_fingerprints)
+            if sr.id
+            and all(
+                isinstance(getattr(sr, attribute, None), shapely.Geometry)
+                for attribute in SR_GEOMETRY_ATTRIBUTES
+            )
+        ]
+        if not rows or not self.is_available():
+            return
+        with self.engine.begin() as connection:
+            connection.execute(
+                delete(self.table).where(
+                    self.table.c.id.in_([row["id"] for row in rows])
+                )
+            )
+            connection.execute(insert(self.table), rows)
+        self.logger.debug(f"{len(rows)} SR geometries stored in the cache!")
+
+    def check_availability(self) -> None:
+        if not self.is_available():
+            self.logger.critical(
+                f"SR geometries can only be queried on MySQL 8.0 or later!"
+            )
+            raise NotImplementedError(
+                "SR geometries can only be queried on MySQL 8.0 or later!"
+            )
+
+    def get_ids_in_bounding_box(
+        self, bounding_box: tuple[float, float, float, float]
+    ) -> list[str]:
+        """
+        Returns the IDs of the SRs whose bounding rectangle crosses `bounding_box` (south, west, north, east).
+        """
+        self.check_availability()
+        with self.engine.connect() as connection:
+            return list(
+                connection.execute(
+                    select(self.table.c.id).where(
+                        func.MBRIntersects(
+                            self.table.c.geometry,
+                            get_polygon_of_bounding_box(bounding_box),
+                        )
+                    )
+                ).scalars()
+            )
+
+    def get_ids_near(
+        self, longitude: float, latitude: float, distance: float
+    ) -> list[str]:
+        """
+        Returns the IDs of the SRs with a metre post at most `distance` metres from the point, e.g. a station.
+        """
+        latitude_difference = distance / METRES_PER_DEGREE_OF_LATITUDE
+        longitude_difference = latitude_difference / math.cos(math.radians(latitude))
+        point = literal(
+            shapely.to_wkb(shapely.Point(longitude, latitude)),
+            type_=Geometry("POINT"),
+        )
+        self.check_availability()
+        with self.engine.connect() as connection:
+            return list(
+                connection.execute(
+                    select(self.table.c.id).where(
+                        # the bounding box lets the spatial index leave out most SRs before measuring
+                        func.MBRIntersects(
+                            self.table.c.geometry,
+                            get_polygon_of_bounding_box(
+                                (
+                                    latitude - latitude_difference,
+                                    longitude - longitude_difference,
+                                    latitude + latitude_difference,
+                                    longitude + longitude_difference,
+                                )
+                            ),
+                        ),
+                        # it only measures between points
+                        func.least(
+                            func.ST_Distance_Sphere(
+                                self.table.c.metre_post_from_coordinates, point
+                            ),
+                            func.ST_Distance_Sphere(
+                                self.table.c.metre_post_to_coordinates, point
+                            ),
+                        )
+                        <= distance,
+                    )
+                ).scalars()
+            )
+
+
+def get_polygon_of_bounding_box(bounding_box: tuple[float, float, float, float]) -> Any:
+    south, west, north, east = bounding_box
+    return literal(
+        shapely.to_wkb(shapely.box(west, south, east, north)),
+        type_=Geometry("POLYGON"),
+    )
@@ -0,0 +1,394 @@
+from collections import deque
+from collections.abc import Iterator
+import contextlib
+from functools import cached_property
+import logging
+from typing import Final, List
+
+import numpy as np
+
+# future: report bug (false positive) to JetBrains developers
+# noinspection PyPackageRequirements
+from plum import dispatch
+import shapely
+
+from src.kalauz.OSM_data_processors.OSM_store import Node, OSMStore, Relation, Way
+from src.kalauz.OSM_data_processors.linear_reference import LinearReference
+from src.kalauz.OSM_data_processors.map_data_helpers import *
+from src.kalauz.OSM_data_processors.milestone_index import MilestoneIndex
+from src.kalauz.SR import SR
+
+PREPARED_LINES: Final = [
+    "1",
+    "1d",
+    "8",
+    "9",
+    "17 (1)",
+    "17 (2)",
+    "18",
+    "30",
+    "113 (1)",
+    "113 (2)",
+    "146",
+]
+
+
+@contextlib.contextmanager
+def errors_tolerated_on_unprepared_lines(sr: SR) -> Iterator[None]:
+    try:
+        yield
+    except (IndexError, ValueError, ZeroDivisionError) as exception:
+        if sr.line in PREPARED_LINES:
+            assert sr.id
+            logging.getLogger(__name__).critical(f"Fatal error with {sr}: {exception}")
+            raise
+
+
+def resolve_sr_geometries(srs: list[SR], line_model: "LineModel") -> None:
+    srs_not_on_linear_references = line_model.place_srs_on_linear_references(srs)
+
+    located_srs: list[SR] = []
+    for sr in srs_not_on_linear_references:
+        with errors_tolerated_on_unprepared_lines(sr):
+            line_model.get_coordinates_of_sr(sr)
+            located_srs.append(sr)
+
+    line_model.locate_points(
+        [
+            # future: init `metre_post_from_coordinates` and `metre_post_to_coordinates` in the constructor
+            point
+            for sr in located_srs
+            for point in (sr.metre_post_from_coordinates, sr.metre_post_to_coordinates)  # type: ignore
+        ]
+    )
+    for sr in located_srs:
+        with errors_tolerated_on_unprepared_lines(sr):
+            # future: init `geometry` in the constructor
+            sr.geometry = line_model.get_linestring_of_sr(sr)  # type: ignore
+
+
+def resolve_sr_geometries_of_line(
+    line_osm_data: OSMStore, relation_id: int, srs: list[SR]
+) -> list[SR]:
+    """
+    Entry point of the worker processes of `Mapper.get_sr_geometries`.
+
+    `line_osm_data` only contains the relation of the line and its ways and nodes
+    (see `OSMStore.get_subset`) so that it's cheap to send to another process.
+    """
+    line_model = LineModel(
+        relation=line_osm_data.get_relation(relation_id),
+        ways=list(line_osm_data.ways),
+    )
+    resolve_sr_geometries(srs, line_model)
+    return srs
+
+
+class LineModel:
+    """
+    Everything derived from the OSM data of a single `route=railway` relation
+    that is needed to place SRs on it.
+
+    It is built once per `ref` and shared by all SRs of the line.
+    """
+
+    def __init__(self, relation: Relation, ways: list[Way]) -> None:
+        self.logger = logging.getLogger(__name__)
+
+        self.relation = relation
+        self.ways = ways
+        self.nodes = get_nodes_of_line(self.ways)
+        self.ways_of_nodes = get_ways_of_nodes(self.ways)
+        self.neighbouring_ways = get_neighbouring_ways(self.ways, self.ways_of_nodes)
+        self.milestones = get_milestones(self.nodes)
+        self.milestone_indexes: dict[tuple[str | None, bool], MilestoneIndex] = {}
+        self.ways_at_points: dict[tuple[float, float], Way] = {}
+        self.way_chains: dict[tuple[int, int], list[Way]] = {}
+        self.linear_references: dict[
+            tuple[str | None, bool], LinearReference | None
+        ] = {}
+
+    @cached_property
+    def way_linestrings(self) -> list[shapely.LineString]:
+        return [convert_to_linestring(way) for way in self.ways]
+
+    @cached_property
+    def way_tree(self) -> shapely.STRtree:
+        return shapely.STRtree(self.way_linestrings)
+
+    def get_milestone_index(self, sr: SR) -> MilestoneIndex:
+        key = self.get_milestone_index_key(sr)
+        if key not in self.milestone_indexes:
+            milestones = self.milestones
+            if sr.line == "146":
+                milestones = remove_irrelevant_duplicate_milestones(milestones, sr)
+            if sr.main_track_side:
+                milestones = [
+                    milestone
+                    for milestone in milestones
+                    if any(
+                        way.tags.get("railway:track_side") == sr.main_track_side
+                        for way in self.ways_of_nodes[milestone.id]
+                    )
+                ]
+            self.milestone_indexes[key] = MilestoneIndex(milestones)
+        return self.milestone_indexes[key]
+
+    @staticmethod
+    def get_milestone_index_key(sr: SR) -> tuple[str | None, bool]:
+        return (
+            sr.main_track_side,
+            sr.line == "146" and sr_is_near_kiskunfelegyhaza(sr),
+        )
+
+    def get_linear_reference(self, sr: SR) -> LinearReference | None:
+        key = self.get_milestone_index_key(sr)
+        if key not in self.linear_references:
+            self.linear_references[key] = self.calibrate_linear_reference(
+                self.get_milestone_index(sr).milestones
+            )
+        return self.linear_references[key]
+
+    def calibrate_linear_reference(
+        self, milestones: list[Node]
+    ) -> LinearReference | None:
+        if len(milestones) < 2:
+            return None
+        try:
+            ways_between_milestones = self.get_ways_between_milestones(
+                way_of_greater_milestone=self.ways_of_nodes[milestones[-1].id][0],
+                way_of_lower_milestone=self.ways_of_nodes[milestones[0].id][0],
+            )
+        except ValueError:
+            return None
+
+        ids_of_nodes_between_milestones = {
+            node_id for way in ways_between_milestones for node_id in way.node_ids
+        }
+        if any(
+            milestone.id not in ids_of_nodes_between_milestones
+            for milestone in milestones
+        ):
+            return None
+        linear_reference = LinearReference(
+            linestring=merge_ways_into_linestring(ways_between_milestones),
+            milestones=milestones,
+        )
+        return linear_reference if linear_reference.is_calibrated() else None
+
+    def place_srs_on_linear_references(self, srs: list[SR]) -> list[SR]:
+        """
+        Sets the coordinates and the geometry of the SRs whose line (or track side)
+        has a calibrated linear reference, all SRs of a linear reference at once.
+
+        Returns the SRs that have to be placed milestone by milestone instead.
+        """
+        srs_of_linear_references: dict[LinearReference, list[SR]] = {}
+        srs_not_placed: list[SR] = []
+        for sr in srs:
+            try:
+                linear_reference = self.get_linear_reference(sr)
+            except ValueError:
+                linear_reference = None
+            if linear_reference:
+                srs_of_linear_references.setdefault(linear_reference, []).append(sr)
+            else:
+                srs_not_placed.append(sr)
+
+        for (
+            linear_reference,
+            srs_of_linear_reference,
+        ) in srs_of_linear_references.items():
+            measures = linear_reference.get_measures(
+                np.array(
+                    [
+                        (sr.metre_post_from, sr.metre_post_to)
+                        for sr in srs_of_linear_reference
+                    ],
+                    dtype=float,
+                )
+            )
+            # metre posts beyond the first or the last milestone
+            are_placeable = ~np.isnan(measures).any(axis=1)
+            points = linear_reference.get_points(
+                np.where(are_placeable[:, np.newaxis], measures, 0)
+            )
+            for sr, sr_measures, sr_points, is_placeable in zip(
+                srs_of_linear_reference, measures, points, are_placeable
+            ):
+                if not is_placeable:
+                    srs_not_placed.append(sr)
+                    continue
+                # future: init `metre_post_from_coordinates`, `metre_post_to_coordinates` and `geometry` in the constructor
+                sr.metre_post_from_coordinates, sr.metre_post_to_coordinates = sr_points  # type: ignore
+                sr.geometry = linear_reference.get_substring(*sr_measures)  # type: ignore
+        return srs_not_placed
+
+    def get_coordinates_of_sr(self, sr: SR) -> None:
+        for j, sr_metre_post_boundary in enumerate(
+            (sr.metre_post_from, sr.metre_post_to)
+        ):
+            nearest_milestones = self.get_milestone_index(sr).get_nearest_milestones(
+                sr_metre_post_boundary
+            )
+            if len(nearest_milestones) >= 2:
+                at_percentage_between_milestones = (
+                    get_distance_percentage_between_milestones(
+                        nearest_milestones=nearest_milestones,
+                        metre_post_boundary=sr_metre_post_boundary,
+                    )
+                )
+                way_of_lower_milestone, way_of_greater_milestone = (
+                    # future: use kwargs when https://github.com/beartype/plum/issues/40 is fixed
+                    self.get_ways_at_locations(nearest_milestones)
+                )
+                ways_between_milestones = self.get_ways_between_milestones(
+                    way_of_greater_milestone=way_of_greater_milestone,
+                    way_of_lower_milestone=way_of_lower_milestone,
+                )
+                merged_ways_between_milestones = merge_ways_into_linestring(
+                    ways_between_milestones
+                )
+                line_between_milestones = line_between_points(
+                    full_line=merged_ways_between_milestones,
+                    points=(
+                        convert_node_to_point(nearest_milestones[0]),
+                        convert_node_to_point(nearest_milestones[-1]),
+                    ),
+                )
+                coordinate_of_metre_post = line_between_milestones.interpolate(
+                    distance=at_percentage_between_milestones,
+                    normalized=True,
+                )
+                if milestones_are_in_reverse_order(
+                    coordinate_of_metre_post, nearest_milestones
+                ):
+                    coordinate_of_metre_post = line_between_milestones.interpolate(
+                        distance=1 - at_percentage_between_milestones,
+                        normalized=True,
+                    )
+            else:
+                coordinate_of_metre_post = convert_node_to_point(nearest_milestones[0])
+
+            # future: init `metre_post_from_coordinates` and `metre_post_to_coordinates` in the constructor
+            if sr_metre_post_boundary == sr.metre_post_from:
+                sr.metre_post_from_coordinates = coordinate_of_metre_post  # type: ignore
+            else:
+                sr.metre_post_to_coordinates = coordinate_of_metre_post  # type: ignore
+
+    def get_linestring_of_sr(self, sr: SR) -> shapely.LineString:
+        way_of_metre_post_from, way_of_metre_post_to = self.get_ways_at_locations(
+            # future: use kwargs when https://github.com/beartype/plum/issues/40 is fixed
+            [
+                # future: init `metre_post_from_coordinates` and `metre_post_to_coordinates` in the constructor
+                sr.metre_post_from_coordinates,  # type: ignore
+                sr.metre_post_to_coordinates,  # type: ignore
+            ]
+        )
+        ways_between_metre_posts = self.get_ways_between_milestones(
+            way_of_greater_milestone=way_of_metre_post_to,
+            way_of_lower_milestone=way_of_metre_post_from,
+        )
+        merged_ways_between_metre_posts = merge_ways_into_linestring(
+            ways_between_metre_posts
+        )
+        return line_between_points(
+            full_line=merged_ways_between_metre_posts,
+            points=(sr.metre_post_from_coordinates, sr.metre_post_to_coordinates),  # type: ignore
+        )
+
+    @dispatch
+    # future: make `nearest_milestones` a two-element tuple?
+    def get_ways_at_locations(self, locations: List[Node]) -> tuple[Way, Way]:
+        ways_of_lower_milestone = self.ways_of_nodes.get(locations[0].id)
+        ways_of_greater_milestone = self.ways_of_nodes.get(locations[-1].id)
+
+        if ways_of_lower_milestone and ways_of_greater_milestone:
+            return ways_of_lower_milestone[0], ways_of_greater_milestone[0]
+        if not ways_of_lower_milestone:
+            self.logger.critical(
+                f"Way of https://www.openstreetmap.org/node/{locations[0].id} "
+                f"at {locations[0].lon}, {locations[0].lat} not found!"
+            )
+        if not ways_of_greater_milestone:
+            self.logger.critical(
+                f"Way of https://www.openstreetmap.org/node/{locations[-1].id} "
+                f"at {locations[-1].lon}, {locations[-1].lat} not found!"
+            )
+        raise ValueError
+
+    # future: request mypy support from plum developers
+    @dispatch  # type: ignore
+    def get_ways_at_locations(self, locations: List[shapely.Point]) -> tuple[Way, Way]:
+        self.locate_points([locations[0], locations[-1]])
+        way_of_lower_metre_post = self.ways_at_points.get(
+            (locations[0].x, locations[0].y)
+        )
+        way_of_greater_metre_post = self.ways_at_points.get(
+            (locations[-1].x, locations[-1].y)
+        )
+
+        if way_of_lower_metre_post and way_of_greater_metre_post:
+            return way_of_lower_metre_post, way_of_greater_metre_post
+        if not way_of_lower_metre_post:
+            self.logger.critical(f"Way of point at {locations[0].wkt} not found!")
+        if not way_of_greater_metre_post:
+            self.logger.critical(f"Way of point at {locations[-1].wkt} not found!")
+        raise ValueError
+
+    def locate_points(self, points: list[shapely.Point]) -> None:
+        points = [
+            point for point in points if (point.x, point.y) not in self.ways_at_points
+        ]
+        if not points:
+            return
+
+        indexes_of_points, indexes_of_ways = self.way_tree.query(
+            points,
+            predicate="dwithin",
+            distance=POINT_ON_LINE_TOLERANCE,
+        )
+        # the first way of the line wins if a point is on more of them
+        for point_index, way_index in sorted(zip(indexes_of_points, indexes_of_ways)):
+            self.ways_at_points.setdefault(
+                (points[point_index].x, points[point_index].y), self.ways[way_index]
+            )
+
+    def get_ways_between_milestones(
+        self,
+        way_of_greater_milestone: Way,
+        way_of_lower_milestone: Way,
+    ) -> list[Way]:
+        if way_of_lower_milestone == way_of_greater_milestone:
+            return [way_of_lower_milestone]
+
+        key = (way_of_lower_milestone.id, way_of_greater_milestone.id)
+        if key not in self.way_chains:
+            if key[::-1] in self.way_chains:
+                self.way_chains[key] = self.way_chains[key[::-1]][::-1]
+            else:
+                self.way_chains[key] = self.get_shortest_way_chain(
+                    from_way=way_of_lower_milestone,
+                    to_way=way_of_greater_milestone,
+                )
+        return self.way_chains[key]
+
+    def get_shortest_way_chain(self, from_way: Way, to_way: Way) -> list[Way]:
+        previous_ways: dict[int, Way | None] = {from_way.id: None}
+        ways_to_visit = deque([from_way])
+        while ways_to_visit:
+            way = ways_to_visit.popleft()
+            if way == to_way:
+                way_chain = [way]
+                while previous_way := previous_ways[way_chain[-1].id]:
+                    way_chain.append(previous_way)
+                return way_chain[::-1]
+
+            for neighbouring_way in self.neighbouring_ways[way.id]:
+                if neighbouring_way.id not in previous_ways:
+                    previous_ways[neighbouring_way.id] = way
+                    ways_to_visit.append(neighbouring_way)
+        raise ValueError(
+            f"Couldn't reach destination_way (https://openstreetmap.org/way/{to_way.id}) "
+            f"from way_of_lower_milestone (https://openstreetmap.org/way/{from_way.id})!"
+        )
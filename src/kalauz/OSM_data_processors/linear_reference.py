@@ -0,0 +1,61 @@
+import numpy as np
+import shapely
+from shapely.ops import substring
+
+from src.kalauz.OSM_data_processors.OSM_store import Node
+from src.kalauz.OSM_data_processors.map_data_helpers import (
+    convert_node_to_point,
+    get_milestone_location,
+)
+
+
+class LinearReference:
+    """
+    A merged linestring of a line (or of one of its track sides) calibrated with
+    its milestones: metre posts are mapped to distances along the linestring
+    by linear interpolation between the milestones around them.
+    """
+
+    def __init__(self, linestring: shapely.LineString, milestones: list[Node]) -> None:
+        self.linestring = linestring
+        self.positions = np.array(
+            [get_milestone_location(milestone) for milestone in milestones],
+            dtype=float,
+        )
+        self.measures = shapely.line_locate_point(
+            self.linestring,
+            [convert_node_to_point(milestone) for milestone in milestones],
+        )
+
+    def is_calibrated(self) -> bool:
+        if len(self.positions) < 2 or np.any(np.diff(self.positions) <= 0):
+            return False
+        differences_of_measures = np.diff(self.measures)
+        return bool(
+            np.all(differences_of_measures > 0) or np.all(differences_of_measures < 0)
+        )
+
+    def get_measures(self, metre_posts: np.ndarray) -> np.ndarray:
+        return np.interp(
+            metre_posts,
+            self.positions,
+            self.measures,
+            left=np.nan,
+            right=np.nan,
+        )
+
+    def get_points(self, measures: np.ndarray) -> np.ndarray:
+        return shapely.line_interpolate_point(self.linestring, measures)
+
+    def get_substring(
+        self, measure_from: float, measure_to: float
+    ) -> shapely.LineString:
+        geometry = substring(
+            geom=self.linestring,
+            start_dist=measure_from,
+            end_dist=measure_to,
+        )
+        if isinstance(geometry, shapely.Point):
+            # SRs with the same metre posts at both ends are shown as a path of zero length
+            return shapely.LineString([geometry, geometry])
+        return geometry
@@ -1,8 +1,10 @@
+from typing import Final
+
 # future: remove the comment below when stubs for the library below are available
 import geojson  # type: ignore
 
 # future: remove the comment below when stubs for the library below are available
-from overpy import Area, Element, Node, Relation, Way  # type: ignore
+from overpy import Area, Element  # type: ignore
 
 # future: report bug (false positive) to JetBrains developers
 # noinspection PyPackageRequirements
@@ -14,7 +16,12 @@ from shapely import distance
 
 from shapely.ops import split, substring
 
-from src.kalauz.OSM_data_processors.hashable_node_snapshot import HashableNodeSnapshot
+from src.kalauz.OSM_data_processors.OSM_store import (
+    Node,
+    Relation,
+    Way,
+    get_nodes_of_ways,
+)
 from src.kalauz.SR import SR
 
 
@@ -30,14 +37,43 @@ def extract_operating_site_polygons(
     return operating_site_areas, operating_site_relations
 
 
-def get_nodes_of_line(ways_of_line: list[Way]) -> set[Node]:
-    nodes_of_line = set(
-        HashableNodeSnapshot(node) for way in ways_of_line for node in way.nodes
-    )
-    return nodes_of_line
+def normalize_ref(ref: str) -> str:
+    return ref.strip().upper()
+
+
+def get_nodes_of_line(ways_of_line: list[Way]) -> list[Node]:
+    return get_nodes_of_ways(ways_of_line)
+
+
+def get_ways_of_nodes(ways_of_line: list[Way]) -> dict[int, list[Way]]:
+    ways_of_nodes: dict[int, list[Way]] = {}
+    for way in ways_of_line:
+        for node_id in dict.fromkeys(way.node_ids):
+            ways_of_nodes.setdefault(node_id, []).append(way)
+    return ways_of_nodes
+
+
+def get_neighbouring_ways(
+    ways_of_line: list[Way], ways_of_nodes: dict[int, list[Way]]
+) -> dict[int, list[Way]]:
+    neighbouring_ways: dict[int, dict[int, Way]] = {way.id: {} for way in ways_of_line}
+    for way in ways_of_line:
+        node_ids = way.node_ids
+        # nodes missing from the response are left out of their ways, so a way can have none
+        if not node_ids:
+            continue
+        for endpoint_id in node_ids[0], node_ids[-1]:
+            for way_at_endpoint in ways_of_nodes[endpoint_id]:
+                if way_at_endpoint != way:
+                    neighbouring_ways[way.id][way_at_endpoint.id] = way_at_endpoint
+                    neighbouring_ways[way_at_endpoint.id][way.id] = way
+    return {
+        way_id: list(neighbours.values())
+        for way_id, neighbours in neighbouring_ways.items()
+    }
 
 
-def get_milestones(nodes: set[Node]) -> list[Node]:
+def get_milestones(nodes: list[Node]) -> list[Node]:
     milestones = [
         node
         for node in nodes
@@ -63,7 +99,7 @@ def merge_ways_into_linestring(
 ) -> shapely.LineString:
     coordinates: list[tuple[float, float]] = []
     for way in ways_between_milestones:
-        way_coordinates = [(float(node.lon), float(node.lat)) for node in way.nodes]
+        way_coordinates = [(lon, lat) for lon, lat in way.coordinates.tolist()]
         if coordinates:
             fix_misaligned_list_orders(coordinates, way_coordinates)
         coordinates.extend(way_coordinates)
@@ -85,52 +121,26 @@ def split_lines(
     )
 
 
-def get_nearest_milestone(
-    exact_location: int, milestones: list[Node], sr: SR, on_ways: list[Way]
-) -> Node:
-    milestones.sort(key=lambda x: abs(get_milestone_location(x) - exact_location))
-    for milestone in milestones:
-        for way in on_ways:
-            if milestone in way.nodes:
-                if sr.main_track_side:
-                    try:
-                        if way.tags["railway:track_side"] == sr.main_track_side:
-                            return milestone
-                    except KeyError:
-                        continue
-                else:
-                    return milestone
-    assert sr.id
-    raise ValueError(
-        f"Nearest milestone not found for metre post {exact_location}!\n"
-        f"This might be due to a missing milestone near the end of the line "
-        f"or the way(s) of an existing milestone not being part of the corresponding route=railway relation."
-    )
-
-
 @dispatch
 def convert_to_geojson(feature: Way) -> geojson.LineString:
-    return geojson.LineString(
-        [(float(node.lon), float(node.lat)) for node in feature.nodes]
-    )
+    return geojson.LineString(feature.coordinates.tolist())
 
 
 # future: request mypy support from plum developers
 @dispatch  # type: ignore
 def convert_to_geojson(feature: shapely.LineString) -> geojson.LineString:
-    return geojson.LineString(
-        [(float(point[0]), float(point[1])) for point in feature.coords]
-    )
+    return geojson.LineString(shapely.get_coordinates(feature).tolist())
 
 
 def convert_to_linestring(way: Way) -> shapely.LineString:
-    return shapely.LineString(
-        [(float(node.lon), float(node.lat)) for node in way.nodes]
-    )
+    return shapely.LineString(way.coordinates)
+
+
+POINT_ON_LINE_TOLERANCE: Final = 1e-14
 
 
 def point_on_line_if_you_squint(point: shapely.Point, line: shapely.LineString) -> bool:
-    return line.distance(point) < 1e-14
+    return line.distance(point) < POINT_ON_LINE_TOLERANCE
 
 
 def get_percentage(number_one: int, number_two: int) -> int:
@@ -141,18 +151,6 @@ def get_length(geod: Geod, linestring: shapely.LineString) -> float:
     return geod.geometry_length(linestring)
 
 
-def further_in_same_direction(
-    milestone: Node, current_nearest_milestones: list[Node], metre_post: int
-) -> bool:
-    return get_milestone_location(milestone) < get_milestone_location(
-        current_nearest_milestones[-1]
-    ) < metre_post or metre_post < get_milestone_location(
-        current_nearest_milestones[-1]
-    ) < get_milestone_location(
-        milestone
-    )
-
-
 def get_distance_percentage_between_milestones(
     nearest_milestones: list[Node], metre_post_boundary: int
 ) -> float:
@@ -199,6 +197,10 @@ def fix_misaligned_list_orders(
                 return
 
 
+def sr_is_near_kiskunfelegyhaza(sr: SR) -> bool:
+    return sr.station_from in ["Kiskunfélegyháza", "Tiszaalpár"]
+
+
 def remove_irrelevant_duplicate_milestones(
     milestones: list[Node], sr: SR
 ) -> list[Node]:
@@ -214,7 +216,7 @@ def remove_irrelevant_duplicate_milestones(
         11900570236,
         11900570235,
     ]
-    if sr.station_from in ["Kiskunfélegyháza", "Tiszaalpár"]:
+    if sr_is_near_kiskunfelegyhaza(sr):
         return [
             milestone
             for milestone in milestones
@@ -278,12 +280,7 @@ def line_between_points(
 
 
 def convert_node_to_point(nearest_milestones: Node) -> shapely.Point:
-    return shapely.Point(
-        (
-            float(nearest_milestones.lon),
-            float(nearest_milestones.lat),
-        )
-    )
+    return shapely.Point(nearest_milestones.lon, nearest_milestones.lat)
 
 
 def milestones_are_in_reverse_order(
@@ -296,34 +293,3 @@ def milestones_are_in_reverse_order(
         coordinate_of_metre_post,
         shapely.Point(nearest_milestones[-1].lon, nearest_milestones[-1].lat),
     )
-
-
-def get_nearest_milestones(
-    milestones: list[Node],
-    metre_post: int,
-    sr: SR,
-    on_ways: list[Way],
-) -> list[Node]:
-    if sr.line == "146":
-        milestones = remove_irrelevant_duplicate_milestones(milestones, sr)
-
-    nearest_milestones: list[Node] = []
-    while len(nearest_milestones) < 2:
-        seemingly_nearest_milestone = get_nearest_milestone(
-            exact_location=metre_post,
-            milestones=milestones,
-            sr=sr,
-            on_ways=on_ways,
-        )
-        if get_milestone_location(seemingly_nearest_milestone) == metre_post:
-            return [seemingly_nearest_milestone]
-        if not nearest_milestones or not (
-            further_in_same_direction(
-                milestone=seemingly_nearest_milestone,
-                current_nearest_milestones=nearest_milestones,
-                metre_post=metre_post,
-            )
-        ):
-            nearest_milestones.append(seemingly_nearest_milestone)
-        milestones.remove(seemingly_nearest_milestone)
-    return nearest_milestones
@@ -0,0 +1,113 @@
+import base64
+import gzip
+import json
+import os
+from string import Template
+from types import TracebackType
+from typing import Any, NamedTuple, TextIO
+
+# future: remove the comment below when stubs for the library below are available
+import geojson  # type: ignore
+import numpy as np
+import shapely
+
+TEMPLATES_DIRECTORY = os.path.join(os.path.dirname(__file__), "templates")
+
+
+class NDJSONFeatureWriter:
+    """
+    Writes GeoJSON features to a newline-delimited GeoJSON file as soon as they're appended
+    so that they don't have to be kept in memory.
+
+    It can be used instead of a list of features.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: TextIO = NotImplemented
+
+    def __enter__(self) -> "NDJSONFeatureWriter":
+        self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(
+        self,
+        exception_type: type[BaseException] | None,
+        exception: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._file.close()
+
+    def append(self, feature: geojson.Feature) -> None:
+        self._file.write(geojson.dumps(feature, ensure_ascii=False))
+        self._file.write("\n")
+
+
+def write_gzipped_geojson(path: str, geojson_object: geojson.GeoJSON) -> None:
+    # the file is compressed while it's written, without the whole text being in memory
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        geojson.dump(geojson_object, file, ensure_ascii=False)
+
+
+def render_template(template_name: str, **values: object) -> str:
+    with open(
+        os.path.join(TEMPLATES_DIRECTORY, template_name), encoding="utf-8"
+    ) as template:
+        return Template(template.read()).substitute(values)
+
+
+def render_map(script_template_name: str, **values: object) -> str:
+    """
+    Returns a page with the basemap, view and tooltip of `map.html`
+    and the script of `script_template_name` loading the data in the format of the map.
+    """
+    return render_template(
+        "map.html", script=render_template(script_template_name, **values), **values
+    )
+
+
+class BinaryPaths(NamedTuple):
+    """
+    The paths of geometries laid out as deck.gl binary attributes:
+    the coordinates of all vertices in one array and the index of the first vertex of each path.
+    """
+
+    positions: np.ndarray
+    start_indices: np.ndarray
+    # multi-part geometries have more than one path
+    geometry_indexes: np.ndarray
+
+    def repeat_for_vertices(self, values_of_geometries: np.ndarray) -> np.ndarray:
+        vertex_counts = np.diff(self.start_indices, append=len(self.positions))
+        return np.repeat(
+            values_of_geometries[self.geometry_indexes], vertex_counts, axis=0
+        )
+
+
+def get_binary_paths(geometries: np.ndarray) -> BinaryPaths:
+    """
+    Returns the parts of `geometries` as paths, geometries that are `None` have none.
+    """
+    parts, geometry_indexes = shapely.get_parts(geometries, return_index=True)
+    positions, part_indexes = shapely.get_coordinates(parts, return_index=True)
+    vertex_counts = np.bincount(part_indexes, minlength=len(parts))
+    return BinaryPaths(
+        # single precision is accurate to about half a metre at the latitudes of Hungary
+        positions=positions.astype(np.float32),
+        start_indices=(np.cumsum(vertex_counts) - vertex_counts).astype(np.uint32),
+        geometry_indexes=geometry_indexes,
+    )
+
+
+def encode_array(array: np.ndarray) -> str:
+    """
+    Returns the bytes of `array` in little-endian order as base64 to be read into a typed array by the browser.
+    """
+    return base64.b64encode(
+        np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<")).tobytes()
+    ).decode("ascii")
+
+
+def encode_json(value: Any) -> str:
+    # `</script>` in a string would end the script embedding it
+    return json.dumps(value, ensure_ascii=False).replace("</", "<\\/")
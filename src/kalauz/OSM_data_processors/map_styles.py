@@ -0,0 +1,44 @@
+import numpy as np
+
+from src.kalauz.SR import SR
+
+
+class ColorScale:
+    """
+    Colours of values by buckets:
+    values below `bucket_limits[0]` get `colors[0]`,
+    values from `bucket_limits[i]` up to `bucket_limits[i + 1]` get `colors[i + 1]`
+    and values from `bucket_limits[-1]` (or NaN) get `colors[-1]`.
+    """
+
+    def __init__(self, bucket_limits: list[float], colors: list[list[int]]) -> None:
+        if len(colors) != len(bucket_limits) + 1:
+            raise ValueError(
+                f"{len(bucket_limits)} bucket limits need {len(bucket_limits) + 1} colours, "
+                f"not {len(colors)}!"
+            )
+        self.bucket_limits = np.asarray(bucket_limits, dtype=np.float64)
+        self.colors = np.asarray(colors, dtype=np.uint8)
+
+    def get_colors(self, values: np.ndarray) -> np.ndarray:
+        return self.colors[np.digitize(values, self.bucket_limits)]
+
+
+def get_percentages_of_speed_reduction(srs: list[SR]) -> np.ndarray:
+    reduced_speeds = np.array([sr.reduced_speed for sr in srs], dtype=np.float64)
+    operating_speeds = np.array([sr.operating_speed for sr in srs], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.trunc((1 - reduced_speeds / operating_speeds) * 100)
+
+
+def get_colors_of_ways(
+    way_ids: np.ndarray,
+    highlighted_way_ids: list[int],
+    color: list[int],
+    highlight_color: list[int],
+) -> np.ndarray:
+    return np.where(
+        np.isin(way_ids, highlighted_way_ids)[:, np.newaxis],
+        np.asarray(highlight_color, dtype=np.uint8),
+        np.asarray(color, dtype=np.uint8),
+    )
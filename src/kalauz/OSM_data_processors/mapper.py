@@ -1,17 +1,30 @@
 import contextlib
+import glob
+import itertools
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from collections.abc import Iterable, Iterator
 from datetime import datetime, timedelta
-import json
+import os
 import re
-from typing import Any, Final, List
+import time
+from typing import Any, BinaryIO, Final
+
+import ijson  # type: ignore
+import numpy as np
 
 # future: remove the comment below when stubs for the library below are available
-from overpy import Overpass, Result  # type: ignore
-from overpy.exception import OverpassGatewayTimeout  # type: ignore
+from overpy import Overpass  # type: ignore
 
 # future: remove the comment below when stubs for the library below are available
-from pydeck import Deck, Layer, ViewState  # type: ignore
+from overpy.exception import OverpassGatewayTimeout, OverpassRuntimeError  # type: ignore
+
 from requests import HTTPError, Session
-from shapely import from_geojson, get_coordinates
+from shapely import LineString, from_geojson, get_coordinates
 from sqlalchemy.sql import text
 from tenacity import (
     retry,
@@ -20,8 +33,39 @@ from tenacity import (
     wait_exponential,
 )
 
+from src.kalauz.OSM_data_processors.OSM_change import read_osm_change
+from src.kalauz.OSM_data_processors.OSM_extract import read_osm_extract
+from src.kalauz.OSM_data_processors.OSM_store import (
+    OSMStore,
+    OSMStoreBuilder,
+    Relation,
+    Way,
+)
+from src.kalauz.OSM_data_processors.Overpass_cache import OverpassCache
 from src.kalauz.OSM_data_processors.Overpass_queries import *
+from src.kalauz.OSM_data_processors.SR_geometry_cache import SRGeometryCache
+from src.kalauz.OSM_data_processors.line_model import (
+    LineModel,
+    errors_tolerated_on_unprepared_lines,
+    resolve_sr_geometries,
+    resolve_sr_geometries_of_line,
+)
 from src.kalauz.OSM_data_processors.map_data_helpers import *
+from src.kalauz.OSM_data_processors.map_export import (
+    NDJSONFeatureWriter,
+    encode_array,
+    encode_json,
+    get_binary_paths,
+    render_map,
+    write_gzipped_geojson,
+)
+from src.kalauz.OSM_data_processors.map_styles import (
+    ColorScale,
+    get_colors_of_ways,
+    get_percentages_of_speed_reduction,
+)
+from src.kalauz.OSM_data_processors.multi_resolution_ways import MultiResolutionWays
+from src.kalauz.OSM_data_processors.vector_tiles import write_vector_tiles
 from src.kalauz.SR import SR
 from src.kalauz.logging_helpers import *
 from src.kalauz.new_data_processors.common import DataProcessor
@@ -31,14 +75,51 @@ from src.kalauz.new_data_processors.common import DataProcessor
 
 
 class Mapper(DataProcessor):
-    def __init__(self, show_lines_with_no_data: bool) -> None:
+    def __init__(
+        self,
+        show_lines_with_no_data: bool,
+        workers: int = 1,
+        offline: bool = False,
+        overpass_cache_time_to_live: timedelta = timedelta(hours=12),
+        osm_extract: str | None = None,
+        overpass_url: str | None = None,
+        query_threads: int = 1,
+        map_format: str = "geojson",
+        simplification_zoom: float | None = 7,
+    ) -> None:
         super().__init__()
 
         self.TODAY_SIMULATED: Final = datetime(2024, 1, 18, 21, 59, 59)
         self.COLOR_TAG: Final = "line_color"
+        self.SR_COLOR_SCALE: Final = ColorScale(
+            bucket_limits=[0, 20, 30, 40, 99],
+            colors=[
+                [255, 0, 0],
+                [249, 255, 0],
+                [255, 205, 0],
+                [255, 150, 0],
+                [255, 90, 0],
+                [255, 0, 0],
+            ],
+        )
+        self.MAP_VIEW_STATE: Final = {
+            "latitude": 47.180833,
+            "longitude": 19.503056,
+            "zoom": 7,
+        }
+        self.TILE_ZOOM_LEVELS: Final = range(5, 13)
+        self.SIMPLIFICATION_ZOOM_LEVELS: Final = [5, 7, 9, 11, 13]
+        self.WAYS_SIMPLIFIED_AT_ONCE: Final = 10_000
+        self.WAY_COLOR: Final = [25, 25, 25]
+        self.SR_WAY_COLOR: Final = [75, 75, 75]
         self.QUERY_MAIN_PARAMETERS: Final = get_area_boundary()
         self.WAIT_BETWEEN_RETRIES: Final = timedelta(seconds=10)
         self.OPERATORS: Final = ["MÁV", "GYSEV"]
+        self.OSM_CHANGES_DIRECTORY: Final = "data/01_received/OSM_changes"
+        self.BOUNDING_BOX: Final = (45.7, 16.1, 48.6, 22.9)
+        self.MAX_QUERY_SPLITS: Final = 4
+        self.MAX_QUERY_ROUNDS: Final = 3
+        self.MAX_RESPONSE_SIZE: Final = 512 * 1024 * 1024
         self.OPERATING_SITE_TAG_VALUES: Final = [
             "station",
             "halt",
@@ -50,10 +131,22 @@ class Mapper(DataProcessor):
             "site",
         ]
 
-        self._api: Final = Overpass()
+        self._api: Final = Overpass(url=overpass_url)
         self._dowload_session: Final = Session()
+        self._overpass_cache: Final = OverpassCache(
+            directory="data/03_processed/Overpass_cache",
+            time_to_live=overpass_cache_time_to_live,
+            offline=offline,
+        )
+        self._sr_geometry_cache: Final = SRGeometryCache(self.database.engine)
 
         self.show_lines_with_no_data = show_lines_with_no_data
+        self.workers = workers
+        self.osm_extract = osm_extract
+        self.query_threads = query_threads
+        self.map_format = map_format
+        # the ways and SRs are simplified alike for the map to be viewed at about this zoom, in full detail if it's `None`
+        self.simplification_zoom = simplification_zoom
 
         self.query_operating_site_elements = (
             self.QUERY_MAIN_PARAMETERS
@@ -82,39 +175,197 @@ class Mapper(DataProcessor):
             self.query_operating_site_elements + get_route_relations()
         )
 
-        self.osm_data_raw: dict = NotImplemented
-        self.osm_data: Result = NotImplemented
+        self.osm_data: OSMStore = NotImplemented
+        self.relations_by_ref: dict[str, Relation] = {}
+        self.missing_line_refs: set[str] = set()
         self.srs: list[SR] = []
         self.sr_ways: list[int] = []
+        self.line_models: dict[str, LineModel] = {}
 
     def run(self) -> None:
         self.download_osm_data()
+        self.apply_osm_changes()
         self.process_srs()
         self.visualise_srs()
 
     def download_osm_data(self) -> None:
-        self.osm_data = self.run_query(
-            api=self._api,
-            query_text=self.query_final,
+        if self.osm_extract:
+            self.osm_data = read_osm_extract(self.osm_extract, self.OPERATORS)
+        elif self.query_threads > 1:
+            self.osm_data = self.download_osm_data_by_line()
+        else:
+            builder = OSMStoreBuilder()
+            self.add_response(builder, self.query_final)
+            self.osm_data = builder.build()
+        self.index_osm_data()
+
+    def download_osm_data_by_line(self) -> OSMStore:
+        """
+        Sends the operating site query and a query per `route=railway` relation concurrently
+        instead of `query_final` so that a failing query only has to be repeated by itself.
+        Failed queries are sent again in up to `MAX_QUERY_ROUNDS` rounds, the responses of the others are kept.
+        """
+        with self.open_response(
+            self.QUERY_MAIN_PARAMETERS + get_route_relation_ids()
+        ) as response:
+            relation_ids = [
+                element["id"] for element in ijson.items(response, "elements.item")
+            ]
+        queries = [self.query_operating_site_elements] + [
+            get_route_relation(relation_id) for relation_id in relation_ids
+        ]
+
+        builder = OSMStoreBuilder()
+        for round_number in range(1, self.MAX_QUERY_ROUNDS + 1):
+            failed_queries = self.add_responses_in_parallel(builder, queries)
+            if not failed_queries:
+                return builder.build()
+            self.logger.warning(
+                f"{len(failed_queries)} of {len(queries)} Overpass queries failed in round {round_number}!"
+            )
+            queries = failed_queries
+            if round_number < self.MAX_QUERY_ROUNDS:
+                time.sleep(self.WAIT_BETWEEN_RETRIES.total_seconds())
+
+        self.logger.critical(
+            f"{len(queries)} Overpass queries failed even after {self.MAX_QUERY_ROUNDS} rounds! "
+            f"Successful ones are cached, so only the failed ones are sent again on the next run."
         )
+        raise ConnectionError(f"{len(queries)} Overpass queries failed!")
 
-    @retry(
-        retry=retry_if_exception_type(OverpassGatewayTimeout),
-        wait=wait_exponential(min=4, max=10),
-        stop=stop_after_attempt(5),
-    )
-    def run_query(self, api: Overpass, query_text: str) -> Result:
-        self.logger.debug(f"Short query started...")
-        result = api.query(query_text)
-        self.logger.debug(f"...finished!")
-        return result
+    def add_responses_in_parallel(
+        self, builder: OSMStoreBuilder, queries: list[str]
+    ) -> list[str]:
+        """
+        Adds the responses of the queries that succeed to `builder` and returns the ones that failed.
+        """
+        failed_queries: list[str] = []
+        with ThreadPoolExecutor(max_workers=self.query_threads) as executor:
+            queries_of_futures = {
+                executor.submit(self.cache_response, query_text): query_text
+                for query_text in queries
+            }
+            for future in as_completed(queries_of_futures):
+                query_text = queries_of_futures[future]
+                exception = future.exception()
+                if isinstance(
+                    exception, (OverpassGatewayTimeout, OverpassRuntimeError)
+                ):
+                    self.add_responses_of_parts(
+                        builder, query_text, self.BOUNDING_BOX, 1, exception
+                    )
+                elif exception:
+                    self.logger.debug(f"Query failed: {exception}")
+                    failed_queries.append(query_text)
+                else:
+                    # responses are parsed one by one as the builder isn't thread-safe
+                    with self.open_response(query_text) as response:
+                        builder.add_elements_of_file(response)
+        return failed_queries
+
+    def apply_osm_changes(self) -> None:
+        """
+        Applies the osmChange (.osc) files of `OSM_CHANGES_DIRECTORY` in the order of their names.
+        Elements that are older than the OSM data or than the version applied from an earlier file are skipped,
+        so files that the OSM data already contains change nothing.
+        """
+        for path in sorted(
+            glob.glob(os.path.join(self.OSM_CHANGES_DIRECTORY, "*.osc"))
+        ):
+            changed_way_ids, changed_relation_ids = self.osm_data.apply_change(
+                read_osm_change(path)
+            )
+            self.logger.debug(
+                f"{len(changed_way_ids)} ways and {len(changed_relation_ids)} relations changed by {path}!"
+            )
+        self.index_osm_data()
+
+    def index_osm_data(self) -> None:
+        self.relations_by_ref = {}
+        for relation in self.osm_data.relations:
+            if relation.tags.get("route") == "railway" and "ref" in relation.tags:
+                self.relations_by_ref.setdefault(
+                    normalize_ref(relation.tags["ref"]), relation
+                )
+
+    def add_response(
+        self,
+        builder: OSMStoreBuilder,
+        query_text: str,
+        bounding_box: tuple[float, float, float, float] | None = None,
+        splits: int = 0,
+    ) -> None:
+        """
+        Adds the elements of the response to `query_text` restricted to `bounding_box` to `builder`.
+
+        If the query times out or its response is too large, it's sent for the quarters of the bounding box
+        (or of the country) instead. Elements in more of them are only kept once by the builder.
+        """
+        restricted_query_text = (
+            restrict_to_bounding_box(query_text, bounding_box)
+            if bounding_box
+            else query_text
+        )
+        try:
+            self.cache_response(restricted_query_text)
+        except (OverpassGatewayTimeout, OverpassRuntimeError) as exception:
+            self.add_responses_of_parts(
+                builder,
+                query_text,
+                bounding_box or self.BOUNDING_BOX,
+                splits + 1,
+                exception,
+            )
+            return
+
+        with self.open_response(restricted_query_text) as response:
+            builder.add_elements_of_file(response)
+
+    def add_responses_of_parts(
+        self,
+        builder: OSMStoreBuilder,
+        query_text: str,
+        bounding_box: tuple[float, float, float, float],
+        splits: int,
+        exception: Exception,
+    ) -> None:
+        if splits > self.MAX_QUERY_SPLITS:
+            self.logger.critical(
+                f"Query failed even after splitting it {self.MAX_QUERY_SPLITS} times, "
+                f"last in bounding box {bounding_box}!"
+            )
+            raise exception
+
+        self.logger.info(
+            f"Query in bounding box {bounding_box} failed ({exception}), "
+            f"sending it for its quarters..."
+        )
+        for part in split_bounding_box(bounding_box):
+            self.add_response(builder, query_text, part, splits)
+
+    @contextlib.contextmanager
+    def open_response(self, query_text: str) -> Iterator[BinaryIO]:
+        self.cache_response(query_text)
+        response = self._overpass_cache.read(query_text)
+        assert response
+        with response:
+            yield response
+
+    def cache_response(self, query_text: str) -> None:
+        if not self._overpass_cache.contains(query_text):
+            self.logger.debug(f"Query started...")
+            self.run_query_raw(api=self._api, query_text=query_text)
+            self.logger.debug(f"...finished!")
 
     @retry(
         retry=retry_if_exception_type(HTTPError),
         wait=wait_exponential(min=4, max=10),
         stop=stop_after_attempt(5),
     )
-    def run_query_raw(self, api: Overpass, query_text: str) -> bytes:
+    def run_query_raw(self, api: Overpass, query_text: str) -> None:
+        """
+        Streams the response into the cache so that it's never entirely in memory.
+        """
         url = api.url
         response = self._dowload_session.get(
             url=url,
@@ -123,20 +374,42 @@ class Mapper(DataProcessor):
                 "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1.2 Safari/605.1.15"
             },
             data=query_text,
+            stream=True,
         )
+        if response.status_code == 504:
+            raise OverpassGatewayTimeout()
         response.raise_for_status()
+        self._overpass_cache.write(
+            query_text,
+            self.check_response(response.iter_content(chunk_size=1024 * 1024)),
+        )
         self.logger.debug(f"File successfully downloaded from {url}!")
-        return bytes(response.content)
+
+    def check_response(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Passes the chunks of a response through
+        and raises `OverpassRuntimeError` if it's too large or ends with a runtime error (e.g. a timeout).
+        """
+        size = 0
+        end = b""
+        for chunk in chunks:
+            size += len(chunk)
+            if size > self.MAX_RESPONSE_SIZE:
+                raise OverpassRuntimeError(
+                    msg=f"Response larger than {self.MAX_RESPONSE_SIZE} bytes"
+                )
+            # the remark comes after the elements
+            end = (end + chunk)[-4096:]
+            yield chunk
+        if remark := re.search(rb'"remark": *"(runtime error[^"]*)"', end):
+            raise OverpassRuntimeError(msg=remark.group(1).decode())
 
     def download_final(self) -> None:
         self.logger.debug(f"Long query started...")
-        self.osm_data_raw = json.loads(
-            self.run_query_raw(
-                api=self._api,
-                query_text=self.query_final,
-            )
-        )
-        self.osm_data = Result.from_json(self.osm_data_raw)
+        builder = OSMStoreBuilder()
+        self.add_response(builder, self.query_final)
+        self.osm_data = builder.build()
+        self.index_osm_data()
         self.logger.debug(f"...finished!")
         pass
 
@@ -230,395 +503,481 @@ class Mapper(DataProcessor):
     def get_id_of_sr_main_track_ways(self) -> None:
         for sr in self.srs:
             if sr.on_main_track:
-                try:
-                    for relation in self.osm_data.relations:
-                        with contextlib.suppress(KeyError):
-                            if (
-                                relation.tags["route"] == "railway"
-                                and relation.tags["ref"].upper() == sr.line.upper()
-                            ):
-                                for member in relation.members:
-                                    self.sr_ways.append(member.ref)
-                                break
-                    else:
-                        raise ValueError(f"Relation with `ref={sr.line}` not found!")
-                except ValueError as exception:
-                    self.logger.debug(exception)
+                with contextlib.suppress(ValueError):
+                    relation = self.get_corresponding_relation(sr)
+                    for member in relation.members:
+                        self.sr_ways.append(member.ref)
 
     def visualise_srs(self) -> None:
+        if self.map_format == "ndjson":
+            self.visualise_srs_streaming()
+            return
+        if self.map_format == "tiles":
+            self.visualise_srs_as_tiles()
+            return
+        if self.map_format == "binary":
+            self.visualise_srs_as_binary()
+            return
+
         features_to_visualise: list[geojson.Feature] = []
 
-        self.add_all_ways(features_to_visualise)
+        self.add_all_ways(features_to_visualise, zoom=self.simplification_zoom)
         # self.add_all_nodes(features_to_visualise)
 
         self.get_sr_geometries()
-        self.add_sr_geometries(features_to_visualise)
+        self.add_sr_geometries(features_to_visualise, zoom=self.simplification_zoom)
         self.export_map(geojson.FeatureCollection(features_to_visualise))
 
-    def add_sr_geometries(self, features_to_visualise: list[geojson.Feature]) -> None:
-        for sr in self.srs:
-            sr.time_from = sr.time_from.strftime("%Y-%m-%d %H:%M:%S")  # type: ignore
-            if sr.time_to:
-                sr.time_to = sr.time_to.strftime("%Y-%m-%d %H:%M:%S")  # type: ignore
-            infos = sr.__dict__
-            infos = {
-                key: value
-                for key, value in infos.items()
-                if value is not None
-                and key != "metre_post_from_coordinates"
-                and key != "metre_post_to_coordinates"
-                and key != "geometry"
-            }
+    def visualise_srs_streaming(self) -> None:
+        """
+        Writes the features to a newline-delimited GeoJSON file as they're created
+        and exports a map that loads it.
+        """
+        self.get_sr_geometries()
 
-            with contextlib.suppress(AttributeError):
-                feature = geojson.Feature(
-                    geometry=convert_to_geojson(sr.geometry),  # type: ignore
-                    properties=infos,
+        features_file_name = f"map_features_{self.TODAY}.ndjson"
+        self.logger.debug(f"Exporting map started...")
+        with NDJSONFeatureWriter(
+            f"data/04_exported/{features_file_name}"
+        ) as features_to_visualise:
+            self.add_all_ways(features_to_visualise, zoom=self.simplification_zoom)
+            # self.add_all_nodes(features_to_visualise)
+            self.add_sr_geometries(features_to_visualise, zoom=self.simplification_zoom)
+
+        with open(
+            f"data/04_exported/map_ndjson_{self.TODAY}.html", "w", encoding="utf-8"
+        ) as exported_map:
+            exported_map.write(
+                render_map(
+                    "NDJSON_map.js",
+                    title="kalauz",
+                    features_url=features_file_name,
+                    color_tag=self.COLOR_TAG,
+                    **self.MAP_VIEW_STATE,
                 )
-                features_to_visualise.append(feature)
+            )
+        self.logger.debug(f"...finished!")
+
+    def visualise_srs_as_tiles(self) -> None:
+        """
+        Exports the features as a vector tile pyramid and a map that only loads the tiles on the screen.
+        """
+        self.get_sr_geometries()
+
+        ways: list[geojson.Feature] = []
+        # tiles are simplified for each of their zoom levels
+        self.add_all_ways(ways)
+        srs: list[geojson.Feature] = []
+        self.add_sr_geometries(srs)
+
+        self.logger.debug(f"Exporting map started...")
+        write_vector_tiles(
+            layers={"ways": ways, "speed_restrictions": srs},
+            directory="data/04_exported/tiles",
+            zoom_levels=self.TILE_ZOOM_LEVELS,
+        )
+        with open(
+            f"data/04_exported/map_tiles_{self.TODAY}.html", "w", encoding="utf-8"
+        ) as exported_map:
+            exported_map.write(
+                render_map(
+                    "MVT_map.js",
+                    title="kalauz",
+                    tiles_url="tiles/{z}/{x}/{y}.pbf",
+                    color_tag=self.COLOR_TAG,
+                    min_zoom=self.TILE_ZOOM_LEVELS[0],
+                    max_zoom=self.TILE_ZOOM_LEVELS[-1],
+                    **self.MAP_VIEW_STATE,
+                )
+            )
+        self.logger.debug(f"...finished!")
+
+    def visualise_srs_as_binary(self) -> None:
+        """
+        Exports a map with the coordinates and colours passed to deck.gl as typed arrays
+        and the tags and attributes as columns instead of GeoJSON features.
+        """
+        self.get_sr_geometries()
+
+        self.logger.debug(f"Exporting map started...")
+        ways = get_binary_paths(self.get_way_linestrings(self.simplification_zoom))
+        way_colors = get_colors_of_ways(
+            way_ids=self.osm_data.way_ids[self.osm_data.way_exists],
+            highlighted_way_ids=self.sr_ways,
+            color=self.WAY_COLOR,
+            highlight_color=self.SR_WAY_COLOR,
+        )
+        way_tag_set_indexes = self.osm_data.way_tag_set_indexes[
+            self.osm_data.way_exists
+        ]
+
+        srs = [sr for sr in self.srs if hasattr(sr, "geometry")]
+        sr_paths = get_binary_paths(
+            self.get_sr_linestrings(srs, self.simplification_zoom)
+        )
+        sr_colors = np.array(
+            [getattr(sr, self.COLOR_TAG) for sr in srs], dtype=np.uint8
+        ).reshape(-1, 3)
+        sr_properties = [self.get_properties_of_sr(sr) for sr in srs]
+        # colours are passed as typed arrays
+        sr_keys = list(
+            dict.fromkeys(
+                key
+                for properties in sr_properties
+                for key in properties
+                if key != self.COLOR_TAG
+            )
+        )
+
+        with open(
+            f"data/04_exported/map_binary_{self.TODAY}.html", "w", encoding="utf-8"
+        ) as exported_map:
+            exported_map.write(
+                render_map(
+                    "binary_map.js",
+                    title="kalauz",
+                    way_positions=encode_array(ways.positions),
+                    way_start_indices=encode_array(ways.start_indices),
+                    way_colors=encode_array(ways.repeat_for_vertices(way_colors)),
+                    way_tag_set_indexes=encode_array(
+                        way_tag_set_indexes[ways.geometry_indexes].astype(np.uint32)
+                    ),
+                    tag_sets=encode_json(self.osm_data.tag_sets),
+                    sr_positions=encode_array(sr_paths.positions),
+                    sr_start_indices=encode_array(sr_paths.start_indices),
+                    sr_colors=encode_array(sr_paths.repeat_for_vertices(sr_colors)),
+                    sr_indexes=encode_array(
+                        sr_paths.geometry_indexes.astype(np.uint32)
+                    ),
+                    sr_properties=encode_json(
+                        {
+                            key: [properties.get(key) for properties in sr_properties]
+                            for key in sr_keys
+                        }
+                    ),
+                    **self.MAP_VIEW_STATE,
+                )
+            )
+        self.logger.debug(f"...finished!")
+
+    def add_sr_geometries(
+        self,
+        features_to_visualise: list[geojson.Feature] | NDJSONFeatureWriter,
+        zoom: float | None = None,
+    ) -> None:
+        """
+        Adds the SRs simplified like the ways for the map to be shown at `zoom` or in full detail if it's `None`.
+        """
+        srs = [sr for sr in self.srs if hasattr(sr, "geometry")]
+        for sr, linestring in zip(srs, self.get_sr_linestrings(srs, zoom)):
+            feature = geojson.Feature(
+                geometry=convert_to_geojson(linestring),
+                properties=self.get_properties_of_sr(sr),
+            )
+            features_to_visualise.append(feature)
+
+    def get_sr_linestrings(self, srs: list[SR], zoom: float | None) -> np.ndarray:
+        linestrings = np.array([sr.geometry for sr in srs], dtype=object)  # type: ignore
+        if zoom is None:
+            return linestrings
+        return self.simplify_linestrings(linestrings, zoom)
+
+    @staticmethod
+    def get_properties_of_sr(sr: SR) -> dict[str, Any]:
+        sr.time_from = sr.time_from.strftime("%Y-%m-%d %H:%M:%S")  # type: ignore
+        if sr.time_to:
+            sr.time_to = sr.time_to.strftime("%Y-%m-%d %H:%M:%S")  # type: ignore
+        infos = sr.__dict__
+        return {
+            key: value
+            for key, value in infos.items()
+            if value is not None
+            and key != "metre_post_from_coordinates"
+            and key != "metre_post_to_coordinates"
+            and key != "geometry"
+        }
 
     def get_sr_geometries(self) -> None:
         self.logger.info(f"Visualising {len(self.srs)} speed restrictions started...")
         notify_at_indexes = get_when_to_notify(
             data_length=len(self.srs), notification_percentage_interval=2
         )
-        # future: implement multithreading for the loop below
-        for sr_index, sr in enumerate(self.srs):
-            try:
-                ways_of_line = self.get_ways_of_corresponding_line(sr)
-                nodes_of_line = get_nodes_of_line(ways_of_line)
-                milestones_of_line = get_milestones(nodes_of_line)
-
-                self.get_coordinates_of_sr(milestones_of_line, sr, ways_of_line)
-
-                # future: init `geometry` in the constructor
-                sr.geometry = self.get_linestring_of_sr(sr, ways_of_line)  # type: ignore
-                match int((1 - (sr.reduced_speed / sr.operating_speed)) * 100):
-                    case reduced_by if reduced_by in range(0, 20):
-                        setattr(sr, self.COLOR_TAG, [249, 255, 0])
-                    case reduced_by if reduced_by in range(20, 30):
-                        setattr(sr, self.COLOR_TAG, [255, 205, 0])
-                    case reduced_by if reduced_by in range(30, 40):
-                        setattr(sr, self.COLOR_TAG, [255, 150, 0])
-                    case reduced_by if reduced_by in range(40, 99):
-                        setattr(sr, self.COLOR_TAG, [255, 90, 0])
-                    case _:
-                        setattr(sr, self.COLOR_TAG, [255, 0, 0])
-            except (IndexError, ValueError, ZeroDivisionError) as exception:
-                prepared_lines = [
-                    "1",
-                    "1d",
-                    "8",
-                    "9",
-                    "17 (1)",
-                    "17 (2)",
-                    "18",
-                    "30",
-                    "113 (1)",
-                    "113 (2)",
-                    "146",
-                ]
-                if sr.line not in prepared_lines:
-                    pass
-                else:
-                    assert sr.id
-                    self.logger.critical(f"Fatal error with {sr}: {exception}")
-                    raise
-            if sr_index in notify_at_indexes:
-                percentage = int(sr_index / len(self.srs) * 100)
-                self.logger.info(
-                    f"{"⏳ " if percentage < 50 else "⌛️"} {percentage}% done..."
+        sr_indexes_of_lines = self.get_sr_indexes_of_lines()
+        line_fingerprints = self.get_line_fingerprints(sr_indexes_of_lines)
+        sr_indexes_of_lines = self.restore_sr_geometries(
+            sr_indexes_of_lines, line_fingerprints
+        )
+        if self.workers > 1:
+            self.get_sr_geometries_in_parallel(sr_indexes_of_lines, notify_at_indexes)
+        else:
+            srs_done = len(self.srs) - sum(map(len, sr_indexes_of_lines.values()))
+            for ref, sr_indexes in sr_indexes_of_lines.items():
+                resolve_sr_geometries(
+                    srs=[self.srs[sr_index] for sr_index in sr_indexes],
+                    line_model=self.get_line_model(ref),
+                )
+                srs_done = self.notify_about_progress(
+                    srs_done, len(sr_indexes), notify_at_indexes
                 )
+        self.store_sr_geometries(sr_indexes_of_lines, line_fingerprints)
+        self.color_srs()
         self.logger.info(f"✅ 100% done! Finished visualising speed restrictions.")
+        self.log_missing_line_refs()
+
+    def get_line_fingerprints(
+        self, sr_indexes_of_lines: dict[str, list[int]]
+    ) -> dict[str, str]:
+        fingerprints: dict[str, str] = {}
+        for ref in sr_indexes_of_lines:
+            relation = self.relations_by_ref[normalize_ref(ref)]
+            fingerprints[ref] = self.osm_data.get_subset(
+                relation=relation,
+                ways=self.get_ways_of_corresponding_line(relation),
+            ).get_fingerprint()
+        return fingerprints
+
+    def restore_sr_geometries(
+        self,
+        sr_indexes_of_lines: dict[str, list[int]],
+        line_fingerprints: dict[str, str],
+    ) -> dict[str, list[int]]:
+        """
+        Restores the geometries of the SRs cached when their line was the same as now.
 
-    def get_coordinates_of_sr(
-        self, milestones_of_line: list[Node], sr: SR, ways_of_line: list[Way]
+        Returns the indexes of the SRs still to be resolved by line.
+        """
+        sr_indexes = [
+            sr_index
+            for sr_indexes_of_line in sr_indexes_of_lines.values()
+            for sr_index in sr_indexes_of_line
+        ]
+        are_restored = self._sr_geometry_cache.restore(
+            srs=[self.srs[sr_index] for sr_index in sr_indexes],
+            line_fingerprints=[
+                line_fingerprints[ref]
+                for ref, sr_indexes_of_line in sr_indexes_of_lines.items()
+                for _ in sr_indexes_of_line
+            ],
+        )
+        restored_sr_indexes = {
+            sr_index
+            for sr_index, is_restored in zip(sr_indexes, are_restored)
+            if is_restored
+        }
+
+        sr_indexes_to_resolve: dict[str, list[int]] = {}
+        for ref, sr_indexes_of_line in sr_indexes_of_lines.items():
+            sr_indexes_of_line = [
+                sr_index
+                for sr_index in sr_indexes_of_line
+                if sr_index not in restored_sr_indexes
+            ]
+            if sr_indexes_of_line:
+                sr_indexes_to_resolve[ref] = sr_indexes_of_line
+        return sr_indexes_to_resolve
+
+    def store_sr_geometries(
+        self,
+        sr_indexes_of_lines: dict[str, list[int]],
+        line_fingerprints: dict[str, str],
     ) -> None:
-        for j, sr_metre_post_boundary in enumerate(
-            (sr.metre_post_from, sr.metre_post_to)
-        ):
-            milestones_of_line_copy = milestones_of_line.copy()
-            nearest_milestones = get_nearest_milestones(
-                milestones=milestones_of_line_copy,
-                metre_post=sr_metre_post_boundary,
-                sr=sr,
-                on_ways=ways_of_line,
-            )
-            if len(nearest_milestones) >= 2:
-                at_percentage_between_milestones = (
-                    get_distance_percentage_between_milestones(
-                        nearest_milestones=nearest_milestones,
-                        metre_post_boundary=sr_metre_post_boundary,
-                    )
-                )
-                way_of_lower_milestone, way_of_greater_milestone = (
-                    # future: use kwargs when https://github.com/beartype/plum/issues/40 is fixed
-                    self.get_ways_at_locations(nearest_milestones, ways_of_line)
-                )
-                ways_between_milestones = self.get_ways_between_milestones(
-                    way_of_greater_milestone=way_of_greater_milestone,
-                    way_of_lower_milestone=way_of_lower_milestone,
-                    ways_of_line=ways_of_line,
-                )
-                merged_ways_between_milestones = merge_ways_into_linestring(
-                    ways_between_milestones
+        self._sr_geometry_cache.store(
+            srs=[
+                self.srs[sr_index]
+                for sr_indexes in sr_indexes_of_lines.values()
+                for sr_index in sr_indexes
+            ],
+            line_fingerprints=[
+                line_fingerprints[ref]
+                for ref, sr_indexes in sr_indexes_of_lines.items()
+                for _ in sr_indexes
+            ],
+        )
+
+    def color_srs(self) -> None:
+        colors = self.SR_COLOR_SCALE.get_colors(
+            get_percentages_of_speed_reduction(self.srs)
+        ).tolist()
+        for sr, color in zip(self.srs, colors):
+            if hasattr(sr, "geometry"):
+                setattr(sr, self.COLOR_TAG, color)
+
+    def get_sr_indexes_of_lines(self) -> dict[str, list[int]]:
+        sr_indexes_of_lines: dict[str, list[int]] = {}
+        for sr_index, sr in enumerate(self.srs):
+            with errors_tolerated_on_unprepared_lines(sr):
+                relation = self.get_corresponding_relation(sr)
+                sr_indexes_of_lines.setdefault(relation.tags["ref"], []).append(
+                    sr_index
                 )
-                line_between_milestones = line_between_points(
-                    full_line=merged_ways_between_milestones,
-                    points=(
-                        convert_node_to_point(nearest_milestones[0]),
-                        convert_node_to_point(nearest_milestones[-1]),
+        return sr_indexes_of_lines
+
+    def get_sr_geometries_in_parallel(
+        self, sr_indexes_of_lines: dict[str, list[int]], notify_at_indexes: list[int]
+    ) -> None:
+        srs_done = len(self.srs) - sum(map(len, sr_indexes_of_lines.values()))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            sr_indexes_of_futures: dict[Future[list[SR]], list[int]] = {}
+            for ref, sr_indexes in sr_indexes_of_lines.items():
+                relation = self.relations_by_ref[normalize_ref(ref)]
+                future = executor.submit(
+                    resolve_sr_geometries_of_line,
+                    self.osm_data.get_subset(
+                        relation=relation,
+                        ways=self.get_ways_of_corresponding_line(relation),
                     ),
+                    relation.id,
+                    [self.srs[sr_index] for sr_index in sr_indexes],
                 )
-                coordinate_of_metre_post = line_between_milestones.interpolate(
-                    distance=at_percentage_between_milestones,
-                    normalized=True,
+                sr_indexes_of_futures[future] = sr_indexes
+
+            for future in as_completed(sr_indexes_of_futures):
+                sr_indexes = sr_indexes_of_futures[future]
+                for sr_index, sr in zip(sr_indexes, future.result()):
+                    self.srs[sr_index] = sr
+                srs_done = self.notify_about_progress(
+                    srs_done, len(sr_indexes), notify_at_indexes
                 )
-                if milestones_are_in_reverse_order(
-                    coordinate_of_metre_post, nearest_milestones
-                ):
-                    coordinate_of_metre_post = line_between_milestones.interpolate(
-                        distance=1 - at_percentage_between_milestones,
-                        normalized=True,
-                    )
-            else:
-                coordinate_of_metre_post = convert_node_to_point(nearest_milestones[0])
-
-            # future: init `metre_post_from_coordinates` and `metre_post_to_coordinates` in the constructor
-            if sr_metre_post_boundary == sr.metre_post_from:
-                sr.metre_post_from_coordinates = coordinate_of_metre_post  # type: ignore
-            else:
-                sr.metre_post_to_coordinates = coordinate_of_metre_post  # type: ignore
-
-    def get_linestring_of_sr(
-        self, sr: SR, ways_of_line: list[Way]
-    ) -> shapely.LineString:
-        way_of_metre_post_from, way_of_metre_post_to = self.get_ways_at_locations(
-            # future: use kwargs when https://github.com/beartype/plum/issues/40 is fixed
-            [
-                # future: init `metre_post_from_coordinates` and `metre_post_to_coordinates` in the constructor
-                sr.metre_post_from_coordinates,  # type: ignore
-                sr.metre_post_to_coordinates,  # type: ignore
-            ],
-            ways_of_line,
-        )
-        ways_between_metre_posts = self.get_ways_between_milestones(
-            way_of_greater_milestone=way_of_metre_post_to,
-            way_of_lower_milestone=way_of_metre_post_from,
-            ways_of_line=ways_of_line,
-        )
-        merged_ways_between_metre_posts = merge_ways_into_linestring(
-            ways_between_metre_posts
-        )
-        return line_between_points(
-            full_line=merged_ways_between_metre_posts,
-            points=(sr.metre_post_from_coordinates, sr.metre_post_to_coordinates),  # type: ignore
-        )
 
-    def get_ways_of_corresponding_line(self, sr: SR) -> list[Way]:
-        relation = self.get_corresponding_relation(sr)
-        way_ids = [way.ref for way in relation.members]
-        ways = [way for way in self.osm_data.ways if way.id in way_ids]
-        return ways
-
-    @dispatch
-    # future: make `nearest_milestones` a two-element tuple?
-    def get_ways_at_locations(
-        self, locations: List[Node], ways_to_search_in: List[Way]
-    ) -> tuple[Way, Way]:
-        way_of_lower_milestone: Way | None = None
-        way_of_greater_milestone: Way | None = None
-
-        for way in ways_to_search_in:
-            for node in way.nodes:
-                if node == locations[0]:
-                    way_of_lower_milestone = way
-                elif node == locations[-1]:
-                    way_of_greater_milestone = way
-
-                if way_of_lower_milestone and way_of_greater_milestone:
-                    return way_of_lower_milestone, way_of_greater_milestone
-        if not way_of_lower_milestone:
-            self.logger.critical(
-                f"Way of https://www.openstreetmap.org/node/{locations[0].id} "
-                f"at {locations[0].lon}, {locations[0].lat} not found!"
+    def notify_about_progress(
+        self, srs_done: int, srs_just_done: int, notify_at_indexes: list[int]
+    ) -> int:
+        if any(
+            sr_index in notify_at_indexes
+            for sr_index in range(srs_done, srs_done + srs_just_done)
+        ):
+            percentage = int((srs_done + srs_just_done) / len(self.srs) * 100)
+            self.logger.info(
+                f"{"⏳ " if percentage < 50 else "⌛️"} {percentage}% done..."
             )
-        if not way_of_greater_milestone:
-            self.logger.critical(
-                f"Way of https://www.openstreetmap.org/node/{locations[-1].id} "
-                f"at {locations[-1].lon}, {locations[-1].lat} not found!"
+        return srs_done + srs_just_done
+
+    def get_line_model(self, ref: str) -> LineModel:
+        if ref not in self.line_models:
+            relation = self.relations_by_ref[normalize_ref(ref)]
+            self.line_models[ref] = LineModel(
+                relation=relation,
+                ways=self.get_ways_of_corresponding_line(relation),
             )
-        raise ValueError
-
-    # future: request mypy support from plum developers
-    @dispatch  # type: ignore
-    def get_ways_at_locations(
-        self, locations: List[shapely.Point], ways_to_search_in: List[Way]
-    ) -> tuple[Way, Way]:
-        way_of_lower_metre_post: Way | None = None
-        way_of_greater_metre_post: Way | None = None
-
-        for way in ways_to_search_in:
-            way_line = convert_to_linestring(way)
-            if point_on_line_if_you_squint(point=locations[0], line=way_line):
-                way_of_lower_metre_post = way
-            if point_on_line_if_you_squint(point=locations[-1], line=way_line):
-                way_of_greater_metre_post = way
-
-            if way_of_lower_metre_post and way_of_greater_metre_post:
-                return way_of_lower_metre_post, way_of_greater_metre_post
-        if not way_of_lower_metre_post:
-            self.logger.critical(f"Way of point at {locations[0].wkt} not found!")
-        if not way_of_greater_metre_post:
-            self.logger.critical(f"Way of point at {locations[-1].wkt} not found!")
-        raise ValueError
-
-    def get_ways_between_milestones(
-        self,
-        way_of_greater_milestone: Way,
-        way_of_lower_milestone: Way,
-        ways_of_line: list[Way],
-    ) -> list[Way]:
-        if way_of_lower_milestone is way_of_greater_milestone:
-            return [way_of_lower_milestone]
-
-        ways_of_line_copy = ways_of_line.copy()
-        ways_of_line_copy.remove(way_of_lower_milestone)
-        neighbouring_ways_of_lower_milestone: tuple[list[Way], list[Way]] = (
-            [way_of_lower_milestone],
-            [way_of_lower_milestone],
-        )
+        return self.line_models[ref]
 
-        toggle = False
-        return self.add_neighboring_ways(
-            collection=neighbouring_ways_of_lower_milestone,
-            ways_to_search_in=ways_of_line_copy,
-            destination_way=way_of_greater_milestone,
-            toggle=toggle,
+    def get_ways_of_corresponding_line(self, relation: Relation) -> list[Way]:
+        way_ids = dict.fromkeys(
+            member.ref for member in relation.members if member.type == "way"
         )
+        return self.osm_data.get_ways(list(way_ids))
 
-    def add_neighboring_ways(
+    def add_all_ways(
         self,
-        collection: tuple[list[Way], list[Way]],
-        ways_to_search_in: list[Way],
-        destination_way: Way,
-        toggle: bool,
-        one_side_is_dead_end: bool = False,
-    ) -> list[Way]:
-        for way in ways_to_search_in:
-            found_neighbor_way = (collection[toggle][-1].nodes[0] in way.nodes) or (
-                collection[toggle][-1].nodes[-1] in way.nodes
-            )
-            if found_neighbor_way:
-                collection[toggle].append(way)
-                if way is destination_way:
-                    return collection[toggle]
-                ways_to_search_in.remove(way)
-                if not one_side_is_dead_end:
-                    ways_to_search_in.reverse()
-                    toggle = not toggle
-                return self.add_neighboring_ways(
-                    collection,
-                    ways_to_search_in,
-                    destination_way,
-                    toggle,
-                )
-        if one_side_is_dead_end:
-            raise ValueError(
-                f"Couldn't reach destination_way (https://openstreetmap.org/way/{destination_way.id}) "
-                f"from way_of_lower_milestone (https://openstreetmap.org/way/{collection[0][0].id})!"
-            )
-        else:
-            one_side_is_dead_end = True
-            ways_to_search_in.reverse()
-            toggle = not toggle
-            return self.add_neighboring_ways(
-                collection,
-                ways_to_search_in,
-                destination_way,
-                toggle,
-                one_side_is_dead_end,
-            )
-
-    def add_all_ways(self, features_to_visualise: list[geojson.Feature]) -> None:
+        features_to_visualise: list[geojson.Feature] | NDJSONFeatureWriter,
+        zoom: float | None = None,
+    ) -> None:
+        """
+        Adds the ways simplified for the map to be shown at `zoom` or in full detail if it's `None`.
+        """
         self.logger.info(f"Adding all ways started...")
-        for way in self.osm_data.ways:
-            way_line = convert_to_geojson(way)
-            way.tags |= {
-                self.COLOR_TAG: (
-                    [75, 75, 75] if way.id in self.sr_ways else [25, 25, 25]
-                )
-            }
-
+        colors = get_colors_of_ways(
+            way_ids=self.osm_data.way_ids[self.osm_data.way_exists],
+            highlighted_way_ids=self.sr_ways,
+            color=self.WAY_COLOR,
+            highlight_color=self.SR_WAY_COLOR,
+        ).tolist()
+        # linestrings are only built for simplifying, the views of the ways are converted as they are
+        linestrings = (
+            itertools.repeat(None)
+            if zoom is None
+            else self.get_simplified_way_linestrings(zoom)
+        )
+        for way, color, linestring in zip(self.osm_data.ways, colors, linestrings):
+            # ways with less than two nodes have no linestring
+            way_line = convert_to_geojson(way if linestring is None else linestring)
+            # tags are shared by all elements with the same ones, so they're not modified
             feature = geojson.Feature(
                 geometry=way_line,
-                properties=way.tags,
+                properties=way.tags | {self.COLOR_TAG: color},
             )
             features_to_visualise.append(feature)
         self.logger.info(f"...finished!")
 
-    def add_all_nodes(self, features_to_visualise: list[geojson.Feature]) -> None:
+    def get_simplified_way_linestrings(
+        self, zoom: float
+    ) -> Iterator[LineString | None]:
+        """
+        Yields the simplified linestrings of the ways in chunks so that only one chunk is in memory at a time.
+        """
+        way_indexes = np.flatnonzero(self.osm_data.way_exists)
+        for start in range(0, len(way_indexes), self.WAYS_SIMPLIFIED_AT_ONCE):
+            yield from self.get_way_linestrings(
+                zoom, way_indexes[start : start + self.WAYS_SIMPLIFIED_AT_ONCE]
+            )
+
+    def get_way_linestrings(
+        self, zoom: float | None, way_indexes: np.ndarray | None = None
+    ) -> np.ndarray:
+        linestrings = self.osm_data.get_way_linestrings(way_indexes)
+        if zoom is None:
+            return linestrings
+        return self.simplify_linestrings(linestrings, zoom)
+
+    def simplify_linestrings(self, linestrings: np.ndarray, zoom: float) -> np.ndarray:
+        """
+        Simplifies ways and SRs with the same tolerance so that the SRs stay on their ways.
+        """
+        return MultiResolutionWays(
+            linestrings=linestrings,
+            zoom_levels=self.SIMPLIFICATION_ZOOM_LEVELS,
+            latitude=self.MAP_VIEW_STATE["latitude"],
+        ).get_linestrings(zoom)
+
+    def add_all_nodes(
+        self, features_to_visualise: list[geojson.Feature] | NDJSONFeatureWriter
+    ) -> None:
         self.logger.info(f"Adding all nodes started...")
         for node in self.osm_data.nodes:
             if node.id != 1:
-                point = geojson.Point((float(node.lon), float(node.lat)))
-                node.tags |= {self.COLOR_TAG: [0, 0, 0, 0]}
+                point = geojson.Point((node.lon, node.lat))
 
                 feature = geojson.Feature(
                     geometry=point,
-                    properties=node.tags,
+                    properties=node.tags | {self.COLOR_TAG: [0, 0, 0, 0]},
                 )
                 features_to_visualise.append(feature)
         self.logger.info(f"...finished!")
 
     def export_map(self, feature_collection: geojson.FeatureCollection) -> None:
-        geojson_layer = Layer(
-            "GeoJsonLayer",
-            data=feature_collection,
-            pickable=True,
-            line_width_min_pixels=3,
-            get_line_color=self.COLOR_TAG,
-            get_fill_color=[0, 0, 0],
-        )
-        view_state = ViewState(
-            latitude=47.180833,
-            longitude=19.503056,
-            zoom=7,
-        )
-        deck = Deck(
-            layers=[geojson_layer],
-            initial_view_state=view_state,
-        )
+        """
+        Writes the features to a gzip-compressed GeoJSON file and a page loading it
+        so that the data can be cached separately from the page.
+        """
+        features_file_name = f"map_features_{self.TODAY}.geojson.gz"
         self.logger.debug(f"Exporting map started...")
-        deck.to_html(f"data/04_exported/map_pydeck_{self.TODAY}.html")
-        self.rename_title_html_tag(new_name="kalauz")
-        self.logger.debug(f"...finished!")
-
-    def rename_title_html_tag(self, new_name: str) -> None:
-        map_html: str
+        write_gzipped_geojson(
+            f"data/04_exported/{features_file_name}", feature_collection
+        )
         with open(
-            f"data/04_exported/map_pydeck_{self.TODAY}.html", "r"
+            f"data/04_exported/map_geojson_{self.TODAY}.html", "w", encoding="utf-8"
         ) as exported_map:
-            map_html = exported_map.read()
-            map_html = re.sub(
-                r"<title>.*</title>",
-                f"<title>{new_name}</title>",
-                map_html,
-                flags=re.DOTALL,
+            exported_map.write(
+                render_map(
+                    "GeoJSON_map.js",
+                    title="kalauz",
+                    features_url=features_file_name,
+                    color_tag=self.COLOR_TAG,
+                    **self.MAP_VIEW_STATE,
+                )
             )
-        with open(
-            f"data/04_exported/map_pydeck_{self.TODAY}.html", "w"
-        ) as exported_map:
-            exported_map.write(map_html)
+        self.logger.debug(f"...finished!")
 
     def get_corresponding_relation(self, sr: SR) -> Relation:
         try:
-            relation = [
-                relation
-                for relation in self.osm_data.relations
-                if relation.tags["ref"].upper() == sr.line.upper()
-            ][0]
-            return relation
-        except IndexError:
-            self.logger.debug(f"Relation with `ref={sr.line}` not found!")
-            raise
+            return self.relations_by_ref[normalize_ref(sr.line)]
+        except KeyError:
+            self.missing_line_refs.add(sr.line)
+            raise ValueError(f"Relation with `ref={sr.line}` not found!")
+
+    def log_missing_line_refs(self) -> None:
+        if self.missing_line_refs:
+            self.logger.info(
+                f"Relations with the following `ref`s not found: "
+                f"{", ".join(sorted(self.missing_line_refs))}!"
+            )
@@ -0,0 +1,51 @@
+from bisect import bisect_left
+
+from src.kalauz.OSM_data_processors.OSM_store import Node
+from src.kalauz.OSM_data_processors.map_data_helpers import get_milestone_location
+
+
+class MilestoneIndex:
+    """
+    Milestones of a line (or of one of its track sides) sorted by their position
+    so that the ones around a metre post can be found by binary search.
+    """
+
+    def __init__(self, milestones: list[Node]) -> None:
+        self.milestones = sorted(milestones, key=get_milestone_location)
+        self.locations = [
+            get_milestone_location(milestone) for milestone in self.milestones
+        ]
+
+    def get_nearest_milestones(self, metre_post: int) -> list[Node]:
+        index_above = bisect_left(self.locations, metre_post)
+        if (
+            index_above < len(self.locations)
+            and self.locations[index_above] == metre_post
+        ):
+            return [self.milestones[index_above]]
+
+        index_below = index_above - 1
+        if index_below < 0 or index_above >= len(self.locations):
+            raise ValueError(
+                f"Nearest milestone not found for metre post {metre_post}!\n"
+                f"This might be due to a missing milestone near the end of the line "
+                f"or the way(s) of an existing milestone not being part of the corresponding route=railway relation."
+            )
+
+        if (
+            metre_post - self.locations[index_below]
+            <= self.locations[index_above] - metre_post
+        ):
+            index_of_nearest, index_of_other = index_below, index_above
+            index_of_duplicate = index_below - 1
+        else:
+            index_of_nearest, index_of_other = index_above, index_below
+            index_of_duplicate = index_above + 1
+        # keep milestones at the same position together so that the error of
+        #   `get_distance_percentage_between_milestones` can point them out
+        if (
+            0 <= index_of_duplicate < len(self.locations)
+            and self.locations[index_of_duplicate] == self.locations[index_of_nearest]
+        ):
+            index_of_other = index_of_duplicate
+        return [self.milestones[index_of_nearest], self.milestones[index_of_other]]
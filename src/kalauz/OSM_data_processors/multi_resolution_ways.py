@@ -0,0 +1,43 @@
+import math
+
+import numpy as np
+import shapely
+
+
+class MultiResolutionWays:
+    """
+    Douglas–Peucker simplified versions of the linestrings of ways for several zoom levels,
+    each leaving out the details smaller than half a pixel at its zoom level.
+    A version is only simplified when it's first requested.
+    """
+
+    def __init__(
+        self, linestrings: np.ndarray, zoom_levels: list[int], latitude: float
+    ) -> None:
+        self.linestrings = linestrings
+        self.zoom_levels = sorted(zoom_levels)
+        self.latitude = latitude
+        self.linestrings_of_zoom_levels: dict[int, np.ndarray] = {}
+
+    def get_linestrings(self, zoom: float) -> np.ndarray:
+        """
+        Returns the least detailed version that still looks the same at `zoom`.
+        """
+        zoom_level = next(
+            (zoom_level for zoom_level in self.zoom_levels if zoom_level >= zoom),
+            self.zoom_levels[-1],
+        )
+        if zoom_level not in self.linestrings_of_zoom_levels:
+            self.linestrings_of_zoom_levels[zoom_level] = shapely.simplify(
+                self.linestrings,
+                tolerance=get_pixel_size(zoom_level, self.latitude) / 2,
+                preserve_topology=False,
+            )
+        return self.linestrings_of_zoom_levels[zoom_level]
+
+
+def get_pixel_size(zoom: float, latitude: float) -> float:
+    """
+    Returns the height of a pixel at `zoom` and `latitude` in degrees.
+    """
+    return 360 / (256 * 2**zoom) * math.cos(math.radians(latitude))
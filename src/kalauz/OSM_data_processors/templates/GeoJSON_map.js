@@ -0,0 +1,26 @@
+    // browsers don't let pages fetch local files, so serve this directory, e.g. with `python -m http.server`
+    const FEATURES_URL = "$features_url";
+    const COLOR_TAG = "$color_tag";
+
+    function getProperties({object}) {
+        return getPropertiesOfFeature(object, COLOR_TAG);
+    }
+
+    // the file is served as it is, so it's decompressed by the page
+    async function loadFeatures() {
+        const response = await fetch(FEATURES_URL);
+        const text = await new Response(
+            response.body.pipeThrough(new DecompressionStream("gzip"))
+        ).text();
+        const features = new deck.GeoJsonLayer({
+            id: "features",
+            data: JSON.parse(text),
+            pickable: true,
+            lineWidthMinPixels: 3,
+            getLineColor: feature => feature.properties[COLOR_TAG],
+            getFillColor: [0, 0, 0],
+        });
+        map.setProps({layers: [basemap, features]});
+    }
+
+    loadFeatures();
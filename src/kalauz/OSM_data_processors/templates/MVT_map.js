@@ -0,0 +1,25 @@
+    // browsers don't let pages fetch local files, so serve this directory, e.g. with `python -m http.server`
+    const TILES_URL = "$tiles_url";
+    const COLOR_TAG = "$color_tag";
+
+    function getProperties({object}) {
+        return getPropertiesOfFeature(object, COLOR_TAG);
+    }
+
+    // only the tiles on the screen are loaded, tiles above the highest zoom level are scaled up
+    const features = new deck.MVTLayer({
+        id: "features",
+        data: TILES_URL,
+        minZoom: $min_zoom,
+        maxZoom: $max_zoom,
+        binary: false,
+        pickable: true,
+        lineWidthMinPixels: 3,
+        // SRs too short to be drawn as lines at a zoom level are stored as points
+        pointRadiusMinPixels: 3,
+        // colours are stored as JSON as vector tiles can't contain lists
+        getLineColor: feature => JSON.parse(feature.properties[COLOR_TAG]),
+        getFillColor: feature => JSON.parse(feature.properties[COLOR_TAG]),
+    });
+
+    map.setProps({layers: [basemap, features]});
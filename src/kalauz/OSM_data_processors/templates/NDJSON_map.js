@@ -0,0 +1,51 @@
+    // browsers don't let pages fetch local files, so serve this directory, e.g. with `python -m http.server`
+    const FEATURES_URL = "$features_url";
+    const COLOR_TAG = "$color_tag";
+
+    function getProperties({object}) {
+        return getPropertiesOfFeature(object, COLOR_TAG);
+    }
+
+    function getFeatureLayer(features) {
+        return new deck.GeoJsonLayer({
+            id: "features",
+            data: {type: "FeatureCollection", features: features},
+            pickable: true,
+            lineWidthMinPixels: 3,
+            getLineColor: feature => feature.properties[COLOR_TAG],
+            getFillColor: [0, 0, 0],
+            updateTriggers: {getLineColor: features.length},
+        });
+    }
+
+    // the features read so far are drawn every second while the file is being read
+    async function loadFeatures() {
+        const response = await fetch(FEATURES_URL);
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        const features = [];
+        let incompleteLine = "";
+        let drawnAt = performance.now();
+        while (true) {
+            const {done, value} = await reader.read();
+            if (done) {
+                break;
+            }
+            const lines = (incompleteLine + value).split("\n");
+            incompleteLine = lines.pop();
+            for (const line of lines) {
+                if (line) {
+                    features.push(JSON.parse(line));
+                }
+            }
+            if (performance.now() - drawnAt > 1000) {
+                map.setProps({layers: [basemap, getFeatureLayer(features.slice())]});
+                drawnAt = performance.now();
+            }
+        }
+        if (incompleteLine) {
+            features.push(JSON.parse(incompleteLine));
+        }
+        map.setProps({layers: [basemap, getFeatureLayer(features)]});
+    }
+
+    loadFeatures();
@@ -0,0 +1,70 @@
+    // every distinct set of tags of the ways once
+    const TAG_SETS = $tag_sets;
+    // the attributes of the speed restrictions by name
+    const SR_PROPERTIES = $sr_properties;
+
+    // arrays are embedded as base64 of their little-endian bytes
+    async function decode(text, TypedArray) {
+        const response = await fetch("data:application/octet-stream;base64," + text);
+        return new TypedArray(await response.arrayBuffer());
+    }
+
+    function getPathLayer(id, startIndices, positions, colors) {
+        return new deck.PathLayer({
+            id: id,
+            data: {
+                length: startIndices.length,
+                startIndices: startIndices,
+                attributes: {
+                    getPath: {value: positions, size: 2},
+                    getColor: {value: colors, size: 3},
+                },
+            },
+            _pathType: "open",
+            pickable: true,
+            widthMinPixels: 3,
+        });
+    }
+
+    let wayTagSetIndexes = new Uint32Array(0);
+    let srIndexes = new Uint32Array(0);
+
+    function getProperties({layer, index}) {
+        if (!layer || layer.id === "basemap" || index < 0) {
+            return null;
+        }
+        if (layer.id === "ways") {
+            return TAG_SETS[wayTagSetIndexes[index]];
+        }
+        const srIndex = srIndexes[index];
+        return Object.fromEntries(
+            Object.entries(SR_PROPERTIES)
+                .filter(([, values]) => values[srIndex] !== null)
+                .map(([key, values]) => [key, values[srIndex]])
+        );
+    }
+
+    async function loadFeatures() {
+        const [
+            wayStartIndices, wayPositions, wayColors,
+            srStartIndices, srPositions, srColors,
+        ] = await Promise.all([
+            decode("$way_start_indices", Uint32Array),
+            decode("$way_positions", Float32Array),
+            decode("$way_colors", Uint8Array),
+            decode("$sr_start_indices", Uint32Array),
+            decode("$sr_positions", Float32Array),
+            decode("$sr_colors", Uint8Array),
+        ]);
+        wayTagSetIndexes = await decode("$way_tag_set_indexes", Uint32Array);
+        srIndexes = await decode("$sr_indexes", Uint32Array);
+        map.setProps({
+            layers: [
+                basemap,
+                getPathLayer("ways", wayStartIndices, wayPositions, wayColors),
+                getPathLayer("speed_restrictions", srStartIndices, srPositions, srColors),
+            ],
+        });
+    }
+
+    loadFeatures();
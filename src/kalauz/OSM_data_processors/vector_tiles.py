@@ -0,0 +1,224 @@
+import json
+import logging
+import math
+import os
+import shutil
+from typing import Any, Final
+
+# future: remove the comment below when stubs for the library below are available
+import geojson  # type: ignore
+
+# future: remove the comment below when stubs for the library below are available
+import mapbox_vector_tile  # type: ignore
+import numpy as np
+import shapely
+
+EARTH_RADIUS: Final = 6378137.0
+WEB_MERCATOR_HALF_SIZE: Final = math.pi * EARTH_RADIUS
+TILE_EXTENT: Final = 4096
+# in tile coordinates, so that lines crossing the edge of a tile aren't cut visibly
+TILE_BUFFER: Final = 64
+
+
+def write_vector_tiles(
+    layers: dict[str, list[geojson.Feature]], directory: str, zoom_levels: range
+) -> None:
+    """
+    Writes the features of `layers` as Mapbox Vector Tiles to `directory/{z}/{x}/{y}.pbf`.
+    The geometries are simplified for each zoom level so that details smaller than a pixel are left out,
+    and only the tiles with features in them are written.
+    """
+    logger = logging.getLogger(__name__)
+    shutil.rmtree(directory, ignore_errors=True)
+
+    geometries_of_layers = {
+        name: convert_to_web_mercator(
+            np.array(
+                [shapely.geometry.shape(feature["geometry"]) for feature in features],
+                dtype=object,
+            )
+        )
+        for name, features in layers.items()
+    }
+    properties_of_layers = {
+        name: [convert_properties(feature["properties"]) for feature in features]
+        for name, features in layers.items()
+    }
+
+    for zoom in zoom_levels:
+        tile_size = 2 * WEB_MERCATOR_HALF_SIZE / 2**zoom
+        # half a pixel of a 256 px wide tile
+        tolerance = tile_size / 512
+
+        features_of_tiles: dict[tuple[int, int], dict[str, list[dict[str, Any]]]] = {}
+        for name, geometries in geometries_of_layers.items():
+            simplified_geometries = replace_short_lines_with_points(
+                shapely.simplify(geometries, tolerance),
+                min_length=tile_size / TILE_EXTENT,
+            )
+            for index, (x, y) in get_tiles_of_geometries(
+                simplified_geometries, tile_size
+            ):
+                features_of_tiles.setdefault((x, y), {}).setdefault(name, []).append(
+                    {
+                        "geometry": simplified_geometries[index],
+                        "properties": properties_of_layers[name][index],
+                    }
+                )
+
+        written_tiles = sum(
+            write_vector_tile(
+                path=os.path.join(directory, str(zoom), str(x), f"{y}.pbf"),
+                features_of_layers=features_of_layers,
+                bounds=get_bounds_of_tile(x, y, tile_size),
+            )
+            for (x, y), features_of_layers in features_of_tiles.items()
+        )
+        logger.debug(f"{written_tiles} tiles written at zoom level {zoom}!")
+
+
+def write_vector_tile(
+    path: str,
+    features_of_layers: dict[str, list[dict[str, Any]]],
+    bounds: tuple[float, float, float, float],
+) -> bool:
+    """
+    Returns whether the tile was written, it isn't if no feature is left after clipping.
+    """
+    buffer = get_buffer(bounds[2] - bounds[0])
+    clipped_features_of_layers = {}
+    for name, features in features_of_layers.items():
+        clipped_geometries = shapely.clip_by_rect(
+            [feature["geometry"] for feature in features],
+            bounds[0] - buffer,
+            bounds[1] - buffer,
+            bounds[2] + buffer,
+            bounds[3] + buffer,
+        )
+        # lines only touching the edge of the buffer are clipped away
+        clipped_features = [
+            feature | {"geometry": clipped_geometry}
+            for feature, clipped_geometry in zip(features, clipped_geometries)
+            if not clipped_geometry.is_empty
+        ]
+        if clipped_features:
+            clipped_features_of_layers[name] = clipped_features
+    if not clipped_features_of_layers:
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as tile:
+        tile.write(
+            mapbox_vector_tile.encode(
+                [
+                    {"name": name, "features": features}
+                    for name, features in clipped_features_of_layers.items()
+                ],
+                default_options={"quantize_bounds": bounds, "extents": TILE_EXTENT},
+            )
+        )
+    return True
+
+
+def convert_to_web_mercator(geometries: np.ndarray) -> np.ndarray:
+    def project(coordinates: np.ndarray) -> np.ndarray:
+        longitudes, latitudes = np.radians(coordinates).T
+        return np.column_stack(
+            (
+                EARTH_RADIUS * longitudes,
+                EARTH_RADIUS * np.log(np.tan(math.pi / 4 + latitudes / 2)),
+            )
+        )
+
+    return shapely.transform(geometries, project)
+
+
+def get_tiles_of_geometries(
+    geometries: np.ndarray, tile_size: float
+) -> list[tuple[int, tuple[int, int]]]:
+    """
+    Returns the indexes of the geometries paired with the tiles they intersect, buffer included.
+    """
+    buffer = get_buffer(tile_size)
+    bounds = shapely.bounds(geometries)
+    # tiles are numbered from the west and from the north
+    min_xs = np.floor(
+        (bounds[:, 0] - buffer + WEB_MERCATOR_HALF_SIZE) / tile_size
+    ).astype(int)
+    max_xs = np.floor(
+        (bounds[:, 2] + buffer + WEB_MERCATOR_HALF_SIZE) / tile_size
+    ).astype(int)
+    min_ys = np.floor(
+        (WEB_MERCATOR_HALF_SIZE - bounds[:, 3] - buffer) / tile_size
+    ).astype(int)
+    max_ys = np.floor(
+        (WEB_MERCATOR_HALF_SIZE - bounds[:, 1] + buffer) / tile_size
+    ).astype(int)
+    # tiles overlapping the bounding boxes, e.g. of a diagonal line, don't all intersect the geometries
+    candidates = [
+        (index, (x, y))
+        for index in np.flatnonzero(~shapely.is_empty(geometries)).tolist()
+        for x in range(min_xs[index], max_xs[index] + 1)
+        for y in range(min_ys[index], max_ys[index] + 1)
+    ]
+    if not candidates:
+        return []
+    indexes, xs, ys = np.array(
+        [(index, x, y) for index, (x, y) in candidates], dtype=np.int64
+    ).T
+    min_x, min_y, max_x, max_y = get_bounds_of_tile(xs, ys, tile_size)
+    are_intersecting = shapely.intersects(
+        geometries[indexes],
+        shapely.box(min_x - buffer, min_y - buffer, max_x + buffer, max_y + buffer),
+    )
+    return [
+        candidate
+        for candidate, is_intersecting in zip(candidates, are_intersecting)
+        if is_intersecting
+    ]
+
+
+def replace_short_lines_with_points(
+    geometries: np.ndarray, min_length: float
+) -> np.ndarray:
+    """
+    Replaces the lines shorter than `min_length` with their midpoints
+    as they would be left out of the tiles, e.g. SRs with the same metre posts at both ends.
+    """
+    are_short_lines = np.isin(
+        shapely.get_type_id(geometries),
+        [shapely.GeometryType.LINESTRING, shapely.GeometryType.MULTILINESTRING],
+    ) & (shapely.length(geometries) < min_length)
+    geometries = geometries.copy()
+    geometries[are_short_lines] = shapely.line_interpolate_point(
+        geometries[are_short_lines], 0.5, normalized=True
+    )
+    return geometries
+
+
+def get_buffer(tile_size: float) -> float:
+    return tile_size * TILE_BUFFER / TILE_EXTENT
+
+
+def get_bounds_of_tile(
+    x: int, y: int, tile_size: float
+) -> tuple[float, float, float, float]:
+    return (
+        x * tile_size - WEB_MERCATOR_HALF_SIZE,
+        WEB_MERCATOR_HALF_SIZE - (y + 1) * tile_size,
+        (x + 1) * tile_size - WEB_MERCATOR_HALF_SIZE,
+        WEB_MERCATOR_HALF_SIZE - y * tile_size,
+    )
+
+
+def convert_properties(properties: dict[str, Any]) -> dict[str, Any]:
+    # values of vector tile features can only be strings, numbers and booleans
+    return {
+        key: (
+            value
+            if isinstance(value, (str, bool, int, float))
+            else json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+        )
+        for key, value in properties.items()
+        if value is not None
+    }
@@ -0,0 +1,278 @@
+import io
+import json
+import unittest
+
+import numpy as np
+
+from src.kalauz.OSM_data_processors.OSM_change import ElementVersion, OSMChange
+from src.kalauz.OSM_data_processors.OSM_store import OSMStore, OSMStoreBuilder
+
+TIMESTAMP = "2024-05-01T00:00:00Z"
+
+
+def get_node(node_id: int, lon: float, tags: dict[str, str] | None = None) -> dict:
+    return {"type": "node", "id": node_id, "lat": 47.0, "lon": lon, "tags": tags or {}}
+
+
+def get_way(way_id: int, node_ids: list[int]) -> dict:
+    return {
+        "type": "way",
+        "id": way_id,
+        "nodes": node_ids,
+        "tags": {"railway": "rail"},
+    }
+
+
+def get_relation(relation_id: int, way_ids: list[int]) -> dict:
+    return {
+        "type": "relation",
+        "id": relation_id,
+        "tags": {"route": "railway", "ref": str(relation_id)},
+        "members": [{"type": "way", "ref": way_id, "role": ""} for way_id in way_ids],
+    }
+
+
+def get_elements() -> list[dict]:
+    """
+    Returns a line of two ways, 10 with nodes 1, 2, 3 and 11 with nodes 3, 4.
+    """
+    return [
+        get_relation(100, [10, 11]),
+        get_way(10, [1, 2, 3]),
+        get_way(11, [3, 4]),
+        get_node(1, 19.0),
+        get_node(2, 19.1, {"railway": "milestone", "railway:position": "1.0"}),
+        get_node(3, 19.2),
+        get_node(4, 19.3),
+    ]
+
+
+def get_response(timestamp: str, elements: list[dict]) -> io.BytesIO:
+    return io.BytesIO(
+        json.dumps(
+            {"osm3s": {"timestamp_osm_base": timestamp}, "elements": elements}
+        ).encode()
+    )
+
+
+def get_store(elements: list[dict]) -> OSMStore:
+    return OSMStore.from_json(
+        {"osm3s": {"timestamp_osm_base": TIMESTAMP}, "elements": elements}
+    )
+
+
+def get_node_ids_of_ways(store: OSMStore) -> dict[int, list[int]]:
+    return {way.id: way.node_ids for way in store.ways}
+
+
+class TestOSMStoreBuilder(unittest.TestCase):
+    def test_elements_of_several_responses_are_added_once(self) -> None:
+        builder = OSMStoreBuilder()
+        builder.add_elements_of_file(get_response(TIMESTAMP, get_elements()))
+        # the response of another query overlapping the first one
+        builder.add_elements_of_file(
+            get_response(
+                TIMESTAMP,
+                [get_way(11, [3, 4]), get_way(12, [4, 5, 99])]
+                + [get_node(node_id, 19.0 + node_id / 10) for node_id in [3, 4, 5]],
+            )
+        )
+        store = builder.build()
+
+        self.assertEqual(store.node_ids.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(
+            get_node_ids_of_ways(store),
+            # node 99 is missing from the responses
+            {10: [1, 2, 3], 11: [3, 4], 12: [4, 5]},
+        )
+        self.assertEqual(store.way_node_offsets.tolist(), [0, 3, 5, 7])
+        self.assertEqual([relation.id for relation in store.relations], [100])
+        self.assertEqual(
+            dict(zip(store.node_ids.tolist(), store.node_coordinates[:, 0].tolist())),
+            {1: 19.0, 2: 19.1, 3: 19.2, 4: 19.3, 5: 19.5},
+        )
+
+    def test_earliest_timestamp_is_kept(self) -> None:
+        builder = OSMStoreBuilder()
+        for timestamp in [
+            "2024-05-02T00:00:00Z",
+            "2024-05-01T00:00:00Z",
+            "2024-05-03T00:00:00Z",
+        ]:
+            builder.add_elements_of_file(get_response(timestamp, []))
+        builder.add_timestamp(None)
+
+        self.assertEqual(builder.build().timestamp, "2024-05-01T00:00:00Z")
+
+
+class TestOSMStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = get_store(get_elements())
+
+    def test_get_subset(self) -> None:
+        relation = self.store.get_relation(100)
+        subset = self.store.get_subset(relation, self.store.get_ways([11]))
+
+        self.assertEqual(subset.node_ids.tolist(), [3, 4])
+        self.assertEqual(subset.node_coordinates[:, 0].tolist(), [19.2, 19.3])
+        self.assertEqual(get_node_ids_of_ways(subset), {11: [3, 4]})
+        self.assertEqual(subset.get_ways([11])[0].tags, {"railway": "rail"})
+        self.assertEqual(subset.relations, [relation])
+
+    def test_get_subset_keeps_the_order_and_tags_of_the_ways(self) -> None:
+        subset = self.store.get_subset(
+            self.store.get_relation(100), self.store.get_ways([11, 10])
+        )
+
+        self.assertEqual([way.id for way in subset.ways], [11, 10])
+        self.assertEqual(get_node_ids_of_ways(subset), {11: [3, 4], 10: [1, 2, 3]})
+        self.assertEqual(
+            [node.tags for node in subset.nodes if node.id == 2],
+            [{"railway": "milestone", "railway:position": "1.0"}],
+        )
+
+    def test_fingerprint_doesnt_depend_on_the_order_of_the_nodes(self) -> None:
+        elements = get_elements()
+        shuffled_store = get_store(elements[:3] + elements[3:][::-1])
+
+        self.assertEqual(self.store.get_fingerprint(), self.store.get_fingerprint())
+        self.assertEqual(self.store.get_fingerprint(), shuffled_store.get_fingerprint())
+
+    def test_fingerprint_changes_with_the_elements(self) -> None:
+        fingerprint = self.store.get_fingerprint()
+        for elements in [
+            get_elements()[:-1] + [get_node(4, 19.4)],
+            get_elements()[:1] + [get_way(10, [1, 3])] + get_elements()[2:],
+            [get_relation(100, [11, 10])] + get_elements()[1:],
+        ]:
+            self.assertNotEqual(get_store(elements).get_fingerprint(), fingerprint)
+
+
+class TestApplyChange(unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = get_store(get_elements())
+
+    def assert_offsets_are_consistent(self) -> None:
+        offsets = self.store.way_node_offsets
+        self.assertEqual(len(offsets), len(self.store.way_ids) + 1)
+        self.assertEqual(offsets[0], 0)
+        self.assertTrue(np.all(np.diff(offsets) >= 0))
+        self.assertEqual(offsets[-1], len(self.store.way_node_indexes))
+
+    def test_modify(self) -> None:
+        changed_way_ids, changed_relation_ids = self.store.apply_change(
+            OSMChange(
+                upserted=[
+                    get_node(4, 19.4),
+                    get_node(5, 19.5),
+                    get_way(10, [1, 3]),
+                    get_way(12, [4, 5]),
+                    get_relation(100, [10, 11, 12]),
+                ],
+                deleted=[],
+                versions={},
+            )
+        )
+
+        self.assertEqual(
+            get_node_ids_of_ways(self.store), {10: [1, 3], 11: [3, 4], 12: [4, 5]}
+        )
+        self.assertEqual(
+            [(node.id, node.lon) for node in self.store.nodes if node.id >= 4],
+            [(4, 19.4), (5, 19.5)],
+        )
+        # way 11 changes with the coordinates of node 4
+        self.assertEqual(changed_way_ids, {10, 11, 12})
+        self.assertEqual(changed_relation_ids, {100})
+        self.assertEqual(
+            [member.ref for member in self.store.get_relation(100).members],
+            [10, 11, 12],
+        )
+        self.assert_offsets_are_consistent()
+
+    def test_delete(self) -> None:
+        changed_way_ids, _ = self.store.apply_change(
+            OSMChange(upserted=[], deleted=[("way", 11), ("node", 4)], versions={})
+        )
+
+        self.assertEqual(get_node_ids_of_ways(self.store), {10: [1, 2, 3]})
+        self.assertEqual(self.store.get_ways([11]), [])
+        self.assertEqual([node.id for node in self.store.nodes], [1, 2, 3])
+        self.assertEqual(changed_way_ids, {11})
+        self.assert_offsets_are_consistent()
+
+        # deleted elements created again get their old rows back
+        self.store.apply_change(
+            OSMChange(
+                upserted=[get_node(4, 19.3), get_way(11, [3, 4])],
+                deleted=[],
+                versions={},
+            )
+        )
+
+        self.assertEqual(self.store.way_ids.tolist(), [10, 11])
+        self.assertEqual(get_node_ids_of_ways(self.store), {10: [1, 2, 3], 11: [3, 4]})
+        self.assertEqual(
+            self.store.get_fingerprint(), get_store(get_elements()).get_fingerprint()
+        )
+        self.assert_offsets_are_consistent()
+
+    def test_elements_older_than_the_store_are_skipped(self) -> None:
+        changed_way_ids, _ = self.store.apply_change(
+            OSMChange(
+                upserted=[get_way(10, [1, 3])],
+                deleted=[("way", 11)],
+                versions={
+                    ("way", 10): ElementVersion(2, "2024-04-30T00:00:00Z"),
+                    ("way", 11): ElementVersion(2, TIMESTAMP),
+                },
+            )
+        )
+
+        self.assertEqual(changed_way_ids, set())
+        self.assertEqual(get_node_ids_of_ways(self.store), {10: [1, 2, 3], 11: [3, 4]})
+
+    def test_versions_not_newer_than_the_applied_one_are_skipped(self) -> None:
+        for version, node_ids in [(3, [1, 3]), (2, [1, 2]), (3, [2, 3])]:
+            self.store.apply_change(
+                OSMChange(
+                    upserted=[get_way(10, node_ids)],
+                    deleted=[],
+                    versions={
+                        ("way", 10): ElementVersion(version, "2024-05-02T00:00:00Z")
+                    },
+                )
+            )
+
+        self.assertEqual(get_node_ids_of_ways(self.store)[10], [1, 3])
+        self.assert_offsets_are_consistent()
+
+    def test_ways_not_relevant_anymore_are_deleted(self) -> None:
+        self.store.apply_change(
+            OSMChange(
+                upserted=[
+                    {
+                        "type": "way",
+                        "id": 12,
+                        "nodes": [3, 4],
+                        "tags": {"highway": "road"},
+                    },
+                    get_relation(100, [10]),
+                    {
+                        "type": "way",
+                        "id": 11,
+                        "nodes": [3, 4],
+                        "tags": {"highway": "road"},
+                    },
+                ],
+                deleted=[],
+                versions={},
+            )
+        )
+
+        self.assertEqual(get_node_ids_of_ways(self.store), {10: [1, 2, 3]})
+        self.assert_offsets_are_consistent()
+
+
+if __name__ == "__main__":
+    unittest.main()
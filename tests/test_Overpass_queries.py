@@ -0,0 +1,56 @@
+import os
+import re
+import unittest
+
+import requests
+
+from src.kalauz.OSM_data_processors.Overpass_queries import (
+    get_area_boundary,
+    get_route_relations,
+    restrict_to_bounding_box,
+    split_bounding_box,
+)
+
+# around Hegyeshalom, where several lines meet
+BOUNDING_BOX = (47.8, 17.1, 47.95, 17.35)
+QUERY = get_area_boundary() + get_route_relations()
+
+
+class TestRestrictToBoundingBox(unittest.TestCase):
+    def test_recursions_are_restricted(self) -> None:
+        query_text = restrict_to_bounding_box(QUERY, BOUNDING_BOX)
+
+        self.assertNotRegex(query_text, r"[\s;(]>>?;")
+        bounding_box_filter = "({},{},{},{})".format(*BOUNDING_BOX)
+        for statement in re.findall(r"(?:way|node|relation)\([rw]\)[^;]*;", query_text):
+            self.assertTrue(statement.endswith(bounding_box_filter + ";"), statement)
+
+
+@unittest.skipUnless(
+    os.environ.get("OVERPASS_URL"),
+    "set OVERPASS_URL to the interpreter endpoint of an Overpass API instance",
+)
+class TestSplitQuery(unittest.TestCase):
+    def test_quarter_returns_strictly_less_data(self) -> None:
+        elements = get_elements(restrict_to_bounding_box(QUERY, BOUNDING_BOX))
+        for part in split_bounding_box(BOUNDING_BOX):
+            elements_of_part = get_elements(restrict_to_bounding_box(QUERY, part))
+
+            self.assertLess(len(elements_of_part), len(elements))
+            south, west, north, east = part
+            for element in elements_of_part:
+                if element["type"] == "node":
+                    self.assertTrue(south <= element["lat"] <= north)
+                    self.assertTrue(west <= element["lon"] <= east)
+
+
+def get_elements(query_text: str) -> list[dict]:
+    response = requests.post(
+        os.environ["OVERPASS_URL"], data={"data": query_text}, timeout=600
+    )
+    response.raise_for_status()
+    return response.json()["elements"]
+
+
+if __name__ == "__main__":
+    unittest.main()
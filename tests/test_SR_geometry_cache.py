@@ -0,0 +1,169 @@
+from datetime import datetime
+import math
+import unittest
+from unittest.mock import MagicMock
+
+import shapely
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.compiler import compiles
+
+from src.kalauz.OSM_data_processors.SR_geometry_cache import Geometry, SRGeometryCache
+from src.kalauz.SR import SR
+
+EARTH_RADIUS: float = 6_370_986
+
+
+@compiles(Geometry, "sqlite")
+def compile_geometry_in_sqlite(type_: Geometry, compiler: object, **kw: object) -> str:
+    return "BLOB"
+
+
+def get_distance_on_sphere(first: bytes, second: bytes) -> float:
+    first_point, second_point = shapely.from_wkb([first, second])
+    latitudes = [math.radians(first_point.y), math.radians(second_point.y)]
+    longitude_difference = math.radians(second_point.x - first_point.x)
+    return (
+        EARTH_RADIUS
+        * 2
+        * math.asin(
+            math.sqrt(
+                math.sin((latitudes[1] - latitudes[0]) / 2) ** 2
+                + math.cos(latitudes[0])
+                * math.cos(latitudes[1])
+                * math.sin(longitude_difference / 2) ** 2
+            )
+        )
+    )
+
+
+def are_bounding_rectangles_intersecting(first: bytes, second: bytes) -> bool:
+    first_bounds, second_bounds = shapely.bounds(shapely.from_wkb([first, second]))
+    return bool(
+        first_bounds[0] <= second_bounds[2]
+        and second_bounds[0] <= first_bounds[2]
+        and first_bounds[1] <= second_bounds[3]
+        and second_bounds[1] <= first_bounds[3]
+    )
+
+
+def get_engine():
+    """
+    Returns an SQLite database with the MySQL spatial functions used by the cache, computed by shapely.
+    """
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def add_spatial_functions(connection, _) -> None:
+        connection.create_function(
+            "ST_GeomFromWKB", 3, lambda wkb, srid, axis_order: wkb
+        )
+        connection.create_function("ST_AsBinary", 2, lambda wkb, axis_order: wkb)
+        connection.create_function(
+            "MBRIntersects", 2, are_bounding_rectangles_intersecting
+        )
+        connection.create_function("ST_Distance_Sphere", 2, get_distance_on_sphere)
+        connection.create_function("least", 2, min)
+
+    return engine
+
+
+def get_sr(sr_id: str, geometry: shapely.LineString) -> SR:
+    sr = SR(
+        country_code_iso="HU",
+        company_code_uic=55,
+        internal_id=None,
+        decision_id=None,
+        in_timetable=False,
+        due_to_railway_features=False,
+        line="1",
+        metre_post_from=0,
+        metre_post_to=0,
+        station_from="Budapest-Kelenföld",
+        station_to=None,
+        on_main_track=True,
+        main_track_side=None,
+        station_track_switch_source_text=None,
+        station_track_from=None,
+        station_switch_from=None,
+        station_switch_to=None,
+        operating_speed=120,
+        reduced_speed=40,
+        reduced_speed_for_mus=40,
+        not_signalled_from_start_point=None,
+        not_signalled_from_end_point=None,
+        cause_source_text=None,
+        cause_categories=None,
+        time_from=datetime(2024, 1, 1),
+        work_to_be_done=None,
+        time_to=None,
+        comment=None,
+        sr_id=sr_id,
+    )
+    sr.metre_post_from_coordinates = shapely.Point(geometry.coords[0])  # type: ignore
+    sr.metre_post_to_coordinates = shapely.Point(geometry.coords[-1])  # type: ignore
+    sr.geometry = geometry  # type: ignore
+    return sr
+
+
+class TestSRGeometryCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = SRGeometryCache(get_engine())
+        self.srs = [
+            # in Budapest
+            get_sr("a", shapely.LineString([(19.00, 47.46), (19.02, 47.47)])),
+            # in Győr
+            get_sr("b", shapely.LineString([(17.62, 47.68), (17.64, 47.69)])),
+            # of zero length in Szeged
+            get_sr("c", shapely.LineString([(20.14, 46.25), (20.14, 46.25)])),
+        ]
+        self.cache.store(self.srs, ["fingerprint"] * len(self.srs))
+
+    def test_restore(self) -> None:
+        srs = [get_sr(sr.id, shapely.LineString([(0, 0), (1, 1)])) for sr in self.srs]  # type: ignore
+
+        self.assertEqual(
+            self.cache.restore(srs, ["fingerprint", "other", "fingerprint"]),
+            [True, False, True],
+        )
+        self.assertTrue(srs[0].geometry.equals(self.srs[0].geometry))  # type: ignore
+        self.assertTrue(srs[2].geometry.equals(self.srs[2].geometry))  # type: ignore
+
+    def test_get_ids_in_bounding_box(self) -> None:
+        self.assertEqual(
+            self.cache.get_ids_in_bounding_box((47.4, 18.9, 47.5, 19.1)), ["a"]
+        )
+        self.assertEqual(
+            sorted(self.cache.get_ids_in_bounding_box((45.7, 16.1, 48.6, 22.9))),
+            ["a", "b", "c"],
+        )
+        self.assertEqual(self.cache.get_ids_in_bounding_box((48, 21, 48.5, 22)), [])
+
+    def test_get_ids_near(self) -> None:
+        # about 700 m from the first metre post of "a"
+        self.assertEqual(self.cache.get_ids_near(19.00, 47.4663, 1000), ["a"])
+        self.assertEqual(self.cache.get_ids_near(19.00, 47.4663, 500), [])
+        self.assertEqual(self.cache.get_ids_near(20.14, 46.25, 1), ["c"])
+
+
+class TestSRGeometryCacheOnOldMySQL(unittest.TestCase):
+    def setUp(self) -> None:
+        engine = MagicMock()
+        engine.dialect.name = "mysql"
+        engine.dialect.is_mariadb = False
+        engine.dialect.server_version_info = (5, 7, 44)
+        self.cache = SRGeometryCache(engine)
+        self.srs = [get_sr("a", shapely.LineString([(19.00, 47.46), (19.02, 47.47)]))]
+
+    def test_nothing_is_cached(self) -> None:
+        self.cache.store(self.srs, ["fingerprint"])
+
+        self.assertEqual(self.cache.restore(self.srs, ["fingerprint"]), [False])
+        self.cache.engine.begin.assert_not_called()
+
+    def test_queries_are_refused(self) -> None:
+        with self.assertRaises(NotImplementedError):
+            self.cache.get_ids_in_bounding_box((47.4, 18.9, 47.5, 19.1))
+
+
+if __name__ == "__main__":
+    unittest.main()
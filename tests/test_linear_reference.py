@@ -0,0 +1,113 @@
+import math
+import unittest
+
+import numpy as np
+import shapely
+
+from src.kalauz.OSM_data_processors.OSM_store import Node, OSMStore
+from src.kalauz.OSM_data_processors.linear_reference import LinearReference
+
+
+def get_milestones(positions_by_longitude: dict[float, str]) -> list[Node]:
+    store = OSMStore.from_json(
+        {
+            "elements": [
+                {
+                    "type": "node",
+                    "id": node_id,
+                    "lat": 47.0,
+                    "lon": longitude,
+                    "tags": {"railway": "milestone", "railway:position": position},
+                }
+                for node_id, (longitude, position) in enumerate(
+                    positions_by_longitude.items(), start=1
+                )
+            ]
+        }
+    )
+    return list(store.nodes)
+
+
+class TestLinearReference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.linestring = shapely.LineString([(19.0, 47.0), (19.3, 47.0)])
+        self.linear_reference = LinearReference(
+            self.linestring, get_milestones({19.0: "0.0", 19.1: "1.0", 19.3: "3.0"})
+        )
+
+    def test_is_calibrated(self) -> None:
+        self.assertTrue(self.linear_reference.is_calibrated())
+        # metre posts decreasing along the linestring
+        self.assertTrue(
+            LinearReference(
+                self.linestring, get_milestones({19.3: "0.0", 19.1: "2.0"})
+            ).is_calibrated()
+        )
+
+    def test_is_not_calibrated(self) -> None:
+        for positions_by_longitude in [
+            {19.1: "1.0"},
+            # at the same position
+            {19.0: "1.0", 19.1: "1.0"},
+            # out of order along the linestring
+            {19.0: "0.0", 19.2: "1.0", 19.1: "2.0"},
+            # both beyond the end of the linestring
+            {19.4: "0.0", 19.5: "1.0"},
+        ]:
+            with self.subTest(positions_by_longitude=positions_by_longitude):
+                self.assertFalse(
+                    LinearReference(
+                        self.linestring, get_milestones(positions_by_longitude)
+                    ).is_calibrated()
+                )
+
+    def test_get_measures(self) -> None:
+        measures = self.linear_reference.get_measures(
+            np.array([0, 500, 1000, 2000, 3000])
+        )
+
+        np.testing.assert_allclose(measures, [0, 0.05, 0.1, 0.2, 0.3])
+
+    def test_get_measures_outside_the_milestones(self) -> None:
+        measures = self.linear_reference.get_measures(np.array([-1, 3001]))
+
+        self.assertTrue(np.all(np.isnan(measures)))
+
+    def test_get_points(self) -> None:
+        points = self.linear_reference.get_points(np.array([0.05, 0.25]))
+
+        np.testing.assert_allclose(
+            shapely.get_coordinates(points), [(19.05, 47.0), (19.25, 47.0)]
+        )
+
+    def test_get_substring(self) -> None:
+        substring = self.linear_reference.get_substring(0.05, 0.2)
+
+        np.testing.assert_allclose(
+            shapely.get_coordinates(substring), [(19.05, 47.0), (19.2, 47.0)]
+        )
+
+    def test_get_substring_backwards(self) -> None:
+        substring = self.linear_reference.get_substring(0.2, 0.05)
+
+        np.testing.assert_allclose(
+            shapely.get_coordinates(substring), [(19.2, 47.0), (19.05, 47.0)]
+        )
+
+    def test_get_substring_of_zero_length(self) -> None:
+        substring = self.linear_reference.get_substring(0.1, 0.1)
+
+        self.assertIsInstance(substring, shapely.LineString)
+        self.assertTrue(math.isclose(substring.length, 0))
+        np.testing.assert_allclose(
+            shapely.get_coordinates(substring), [(19.1, 47.0), (19.1, 47.0)]
+        )
+
+    def test_get_substring_beyond_the_ends(self) -> None:
+        substring = self.linear_reference.get_substring(-1, 1)
+
+        self.assertTrue(substring.equals(self.linestring))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from src.kalauz.OSM_data_processors.OSM_store import OSMStore, Way
+from src.kalauz.OSM_data_processors.map_data_helpers import (
+    get_neighbouring_ways,
+    get_ways_of_nodes,
+)
+
+
+def get_ways(node_ids_of_ways: dict[int, list[int]]) -> list[Way]:
+    store = OSMStore.from_json(
+        {
+            "elements": [
+                {"type": "way", "id": way_id, "nodes": node_ids, "tags": {}}
+                for way_id, node_ids in node_ids_of_ways.items()
+            ]
+            + [
+                {"type": "node", "id": node_id, "lat": 47.0, "lon": 19.0 + node_id}
+                for node_id in range(1, 6)
+            ]
+        }
+    )
+    return store.get_ways(list(node_ids_of_ways))
+
+
+def get_ids_of_neighbours(ways: list[Way]) -> dict[int, list[int]]:
+    return {
+        way_id: sorted(neighbour.id for neighbour in neighbours)
+        for way_id, neighbours in get_neighbouring_ways(
+            ways, get_ways_of_nodes(ways)
+        ).items()
+    }
+
+
+class TestGetNeighbouringWays(unittest.TestCase):
+    def test_ways_sharing_an_endpoint(self) -> None:
+        ways = get_ways({10: [1, 2, 3], 11: [3, 4], 12: [5, 4], 13: [2, 5]})
+
+        self.assertEqual(
+            get_ids_of_neighbours(ways),
+            # way 13 only touches way 10 in the middle of it
+            {10: [11, 13], 11: [10, 12], 12: [11, 13], 13: [10, 12]},
+        )
+
+    def test_ways_without_nodes(self) -> None:
+        # nodes 98 and 99 are missing from the store
+        ways = get_ways({10: [1, 2], 11: [98, 99], 12: [2, 3]})
+
+        self.assertEqual(ways[1].node_ids, [])
+        self.assertEqual(get_ids_of_neighbours(ways), {10: [12], 11: [], 12: [10]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from tenacity import wait_none
+
+from src.kalauz.OSM_data_processors.mapper import Mapper
+
+RELATION_IDS = [101, 102, 103]
+FAILING_RELATION_ID = 102
+# the retries of a single query within `Mapper.run_query_raw`
+FAILURES_OF_FAILING_RELATION = 5
+
+
+class OverpassStandIn(BaseHTTPRequestHandler):
+    """
+    Answers the queries of `Mapper.download_osm_data_by_line` with a relation, a way and two nodes per line.
+    """
+
+    lock = threading.Lock()
+    queries: list[str] = []
+    queries_in_progress = 0
+    most_queries_in_progress = 0
+
+    def do_GET(self) -> None:
+        query_text = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        with self.lock:
+            self.queries.append(query_text)
+            OverpassStandIn.queries_in_progress += 1
+            OverpassStandIn.most_queries_in_progress = max(
+                self.most_queries_in_progress, self.queries_in_progress
+            )
+            failures = self.queries.count(query_text)
+        # so that the queries sent concurrently overlap
+        time.sleep(0.2)
+        with self.lock:
+            OverpassStandIn.queries_in_progress -= 1
+
+        if "out ids" in query_text:
+            elements = [{"type": "relation", "id": id} for id in RELATION_IDS]
+        elif relation_id := re.search(r"relation\((\d+)\)", query_text):
+            relation_id = int(relation_id.group(1))
+            if (
+                relation_id == FAILING_RELATION_ID
+                and failures <= FAILURES_OF_FAILING_RELATION
+            ):
+                self.send_response(429)
+                self.end_headers()
+                return
+            elements = get_elements_of_line(relation_id)
+        else:
+            elements = [
+                {
+                    "type": "node",
+                    "id": 1,
+                    "lat": 47.5,
+                    "lon": 19.0,
+                    "tags": {"railway": "station"},
+                }
+            ]
+
+        body = json.dumps(
+            {
+                "osm3s": {"timestamp_osm_base": "2024-05-01T00:00:00Z"},
+                "elements": elements,
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def get_elements_of_line(relation_id: int) -> list[dict]:
+    way_id = relation_id * 10
+    node_ids = [relation_id * 100, relation_id * 100 + 1]
+    return [
+        {
+            "type": "relation",
+            "id": relation_id,
+            "tags": {"route": "railway", "ref": str(relation_id)},
+            "members": [{"type": "way", "ref": way_id, "role": ""}],
+        },
+        {"type": "way", "id": way_id, "nodes": node_ids, "tags": {"railway": "rail"}},
+    ] + [
+        {"type": "node", "id": node_id, "lat": 47.0, "lon": 19.0 + index / 100}
+        for index, node_id in enumerate(node_ids)
+    ]
+
+
+class TestDownloadOSMDataByLine(unittest.TestCase):
+    def setUp(self) -> None:
+        OverpassStandIn.queries = []
+        OverpassStandIn.most_queries_in_progress = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), OverpassStandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        # responses are cached relative to the working directory
+        self.working_directory = os.getcwd()
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.temporary_directory.name)
+
+        with patch("src.kalauz.new_data_processors.common.Database", MagicMock()):
+            self.mapper = Mapper(
+                show_lines_with_no_data=True,
+                overpass_url=f"http://127.0.0.1:{self.server.server_port}/api/interpreter",
+                query_threads=4,
+            )
+        self.mapper.WAIT_BETWEEN_RETRIES = timedelta(0)  # type: ignore
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.working_directory)
+        self.temporary_directory.cleanup()
+
+    def test_failing_relation_is_sent_again_and_merged(self) -> None:
+        with patch.object(Mapper.run_query_raw.retry, "wait", wait_none()):  # type: ignore
+            osm_data = self.mapper.download_osm_data_by_line()
+
+        self.assertGreater(OverpassStandIn.most_queries_in_progress, 1)
+        self.assertEqual(
+            sorted(relation.id for relation in osm_data.relations), RELATION_IDS
+        )
+        self.assertEqual(
+            sorted(way.id for way in osm_data.ways),
+            [relation_id * 10 for relation_id in RELATION_IDS],
+        )
+        self.assertEqual(len(list(osm_data.nodes)), 1 + 2 * len(RELATION_IDS))
+        # the queries that succeeded in the first round aren't sent again
+        self.assertEqual(
+            sum(
+                f"relation({FAILING_RELATION_ID})" in query
+                for query in OverpassStandIn.queries
+            ),
+            FAILURES_OF_FAILING_RELATION + 1,
+        )
+        self.assertEqual(
+            len(OverpassStandIn.queries),
+            2 + len(RELATION_IDS) + FAILURES_OF_FAILING_RELATION,
+        )
+
+    def test_relation_failing_in_every_round_aborts(self) -> None:
+        self.mapper.MAX_QUERY_ROUNDS = 1  # type: ignore
+        with patch.object(Mapper.run_query_raw.retry, "wait", wait_none()):  # type: ignore
+            with self.assertRaises(ConnectionError):
+                self.mapper.download_osm_data_by_line()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from src.kalauz.OSM_data_processors.OSM_store import Node, OSMStore
+from src.kalauz.OSM_data_processors.milestone_index import MilestoneIndex
+
+
+def get_milestones(positions: list[str]) -> list[Node]:
+    """
+    Returns milestones with IDs from 1 at the given positions.
+    """
+    store = OSMStore.from_json(
+        {
+            "elements": [
+                {
+                    "type": "node",
+                    "id": node_id,
+                    "lat": 47.0,
+                    "lon": 19.0 + node_id / 100,
+                    "tags": {"railway": "milestone", "railway:position": position},
+                }
+                for node_id, position in enumerate(positions, start=1)
+            ]
+        }
+    )
+    return list(store.nodes)
+
+
+def get_ids(milestones: list[Node]) -> list[int]:
+    return [milestone.id for milestone in milestones]
+
+
+class TestMilestoneIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        # not in the order of their positions
+        self.milestone_index = MilestoneIndex(get_milestones(["2.0", "0.0", "1.0"]))
+
+    def test_milestone_at_the_metre_post(self) -> None:
+        self.assertEqual(
+            get_ids(self.milestone_index.get_nearest_milestones(1000)), [3]
+        )
+        self.assertEqual(get_ids(self.milestone_index.get_nearest_milestones(0)), [2])
+
+    def test_milestones_around_the_metre_post(self) -> None:
+        # the nearest one first
+        self.assertEqual(
+            get_ids(self.milestone_index.get_nearest_milestones(400)), [2, 3]
+        )
+        self.assertEqual(
+            get_ids(self.milestone_index.get_nearest_milestones(600)), [3, 2]
+        )
+        self.assertEqual(
+            get_ids(self.milestone_index.get_nearest_milestones(1500)), [3, 1]
+        )
+
+    def test_metre_post_outside_the_milestones(self) -> None:
+        for metre_post in [-1, 2001]:
+            with self.subTest(metre_post=metre_post):
+                with self.assertRaises(ValueError):
+                    self.milestone_index.get_nearest_milestones(metre_post)
+
+    def test_milestones_at_the_same_position_are_kept_together(self) -> None:
+        milestone_index = MilestoneIndex(get_milestones(["0.0", "1.0", "1.0", "2.0"]))
+
+        self.assertEqual(get_ids(milestone_index.get_nearest_milestones(1200)), [3, 2])
+        self.assertEqual(get_ids(milestone_index.get_nearest_milestones(800)), [2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
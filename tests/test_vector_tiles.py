@@ -0,0 +1,157 @@
+import glob
+import os
+import tempfile
+import unittest
+
+import geojson  # type: ignore
+import mapbox_vector_tile  # type: ignore
+import numpy as np
+import shapely
+
+from src.kalauz.OSM_data_processors.vector_tiles import (
+    WEB_MERCATOR_HALF_SIZE,
+    get_tiles_of_geometries,
+    replace_short_lines_with_points,
+    write_vector_tiles,
+)
+
+# 4 × 4 tiles at zoom level 2
+TILE_SIZE = WEB_MERCATOR_HALF_SIZE / 2
+
+
+def get_line_in_tile_units(
+    coordinates: list[tuple[float, float]],
+) -> shapely.LineString:
+    """
+    Returns a line in Web Mercator given in tiles from the north-west corner of the world.
+    """
+    return shapely.LineString(
+        [
+            (
+                x * TILE_SIZE - WEB_MERCATOR_HALF_SIZE,
+                WEB_MERCATOR_HALF_SIZE - y * TILE_SIZE,
+            )
+            for x, y in coordinates
+        ]
+    )
+
+
+class TestGetTilesOfGeometries(unittest.TestCase):
+    def test_only_the_tiles_intersecting_the_geometry(self) -> None:
+        # its bounding box overlaps tile (1, 0) too
+        line = get_line_in_tile_units([(0.1, 0.1), (1.5, 1.9)])
+
+        self.assertEqual(
+            get_tiles_of_geometries(np.array([line], dtype=object), TILE_SIZE),
+            [(0, (0, 0)), (0, (0, 1)), (0, (1, 1))],
+        )
+
+    def test_tiles_the_buffer_of_which_the_geometry_is_in(self) -> None:
+        # just beyond the eastern edge of tile (0, 0)
+        line = get_line_in_tile_units([(1.001, 0.4), (1.001, 0.6)])
+
+        self.assertEqual(
+            get_tiles_of_geometries(np.array([line], dtype=object), TILE_SIZE),
+            [(0, (0, 0)), (0, (1, 0))],
+        )
+
+    def test_empty_geometries_are_in_no_tiles(self) -> None:
+        self.assertEqual(
+            get_tiles_of_geometries(
+                np.array([shapely.LineString()], dtype=object), TILE_SIZE
+            ),
+            [],
+        )
+
+
+class TestReplaceShortLinesWithPoints(unittest.TestCase):
+    def test_replace_short_lines_with_points(self) -> None:
+        geometries = np.array(
+            [
+                shapely.LineString([(0, 0), (0, 0)]),
+                shapely.LineString([(0, 0), (0.5, 0)]),
+                shapely.LineString([(0, 0), (2, 0)]),
+                shapely.Point(3, 3),
+            ],
+            dtype=object,
+        )
+
+        replaced_geometries = replace_short_lines_with_points(geometries, min_length=1)
+
+        self.assertEqual(
+            [geometry.wkt for geometry in replaced_geometries],
+            [
+                "POINT (0 0)",
+                "POINT (0.25 0)",
+                "LINESTRING (0 0, 2 0)",
+                "POINT (3 3)",
+            ],
+        )
+        self.assertEqual(geometries[0].geom_type, "LineString")
+
+
+class TestWriteVectorTiles(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temporary_directory.name, "tiles")
+
+    def tearDown(self) -> None:
+        self.temporary_directory.cleanup()
+
+    def get_layers_of_tiles(self) -> dict[str, dict]:
+        return {
+            os.path.relpath(path, self.directory): mapbox_vector_tile.decode(
+                open(path, "rb").read()
+            )
+            for path in glob.glob(os.path.join(self.directory, "*", "*", "*.pbf"))
+        }
+
+    def test_zero_length_srs_are_written_as_points(self) -> None:
+        write_vector_tiles(
+            layers={
+                "ways": [
+                    geojson.Feature(
+                        geometry=geojson.LineString([(19.0, 47.0), (19.5, 47.5)]),
+                        properties={"railway": "rail"},
+                    )
+                ],
+                "speed_restrictions": [
+                    geojson.Feature(
+                        geometry=geojson.LineString([(19.25, 47.25), (19.25, 47.25)]),
+                        properties={"line": "1"},
+                    )
+                ],
+            },
+            directory=self.directory,
+            zoom_levels=range(8, 11),
+        )
+        layers_of_tiles = self.get_layers_of_tiles()
+
+        # at zoom level 10 the bounding box of the way overlaps 2 × 3 tiles, but the way only crosses 4 of them
+        self.assertEqual(
+            sorted(layers_of_tiles),
+            ["10/566/358.pbf", "10/566/359.pbf", "10/566/360.pbf", "10/567/358.pbf"]
+            + ["8/141/89.pbf", "8/141/90.pbf", "9/283/179.pbf", "9/283/180.pbf"],
+        )
+        for path, layers in layers_of_tiles.items():
+            for name, layer in layers.items():
+                with self.subTest(path=path, layer=name):
+                    self.assertTrue(layer["features"])
+        self.assertEqual(
+            {
+                path: [
+                    (feature["geometry"]["type"], feature["properties"])
+                    for feature in layers["speed_restrictions"]["features"]
+                ]
+                for path, layers in layers_of_tiles.items()
+                if "speed_restrictions" in layers
+            },
+            {
+                path: [("Point", {"line": "1"})]
+                for path in ["8/141/89.pbf", "9/283/179.pbf", "10/566/359.pbf"]
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()